@@ -0,0 +1,198 @@
+"""
+Draw a batch of images without the app, using the canvas and palette saved by the app
+(or by the calibrate command). Every image is converted and planned in background
+processes as soon as the batch starts, so the next drawing is ready when one ends.
+
+Usage:
+    python batch.py calibrate                  (switch to Gartic Phone with an empty canvas)
+    python batch.py plan IMAGES... [options]   (convert and plan only, e.g. to fill the cache)
+    python batch.py draw IMAGES... [options] [--back-to-back [--gap 5]] [--pacing classic] [--verify]
+
+IMAGES are image files and/or directories of images. Options:
+    --tool pen|box  --details 9  --step 2  --dither none  --rectangles  --group-colors  --optimize-travel  --workers N
+"""
+import argparse
+import os
+import time
+from dataclasses import asdict
+from utils.detect import CALIBRATION_FILE, save_calibration, load_calibration
+from utils.dither import DITHER_MODES
+from utils.jobs import JobOptions, JobQueue, find_images
+from utils.pacing import load_profiles, estimate_draw_time
+from utils.parallel import default_workers
+from utils.session import DrawingSession
+from utils.telemetry import DrawTrace, save_trace
+
+
+def job_options(args) -> JobOptions:
+    return JobOptions(args.tool, args.details, args.step, args.dither, args.rectangles, args.group_colors, args.optimize_travel)
+
+
+def batch_calibrate(args):
+    """
+    Find the canvas and the palette on screen and save them for the other commands.
+    """
+    from utils.automations import detect_gartic_layout
+
+    print(f"Switch to Gartic Phone with an empty canvas and the whole palette visible ({args.delay:g}s)...")
+    time.sleep(args.delay)
+    layout = detect_gartic_layout()
+    if layout is None:
+        print("Canvas or palette not found")
+        return
+    save_calibration(layout, args.calibration)
+    canvas = layout["drawing_bbox"]
+    print(f"Canvas {canvas['width']}x{canvas['height']} at ({canvas['left']}, {canvas['top']}) saved to {args.calibration}")
+
+
+def canvas_size(args) -> tuple | None:
+    """
+    Canvas size to plan for: --width/--height, or the calibrated canvas.
+    """
+    if args.width and args.height:
+        return args.width, args.height
+    layout = load_calibration(args.calibration)
+    if layout is None:
+        print("No calibration saved: run 'python batch.py calibrate', set the areas in the app, or pass --width and --height")
+        return None
+    return layout["drawing_bbox"]["width"], layout["drawing_bbox"]["height"]
+
+
+def pacing_profile(args):
+    """
+    The --pacing profile for --tool, or None (with a message) if there is no such profile.
+    """
+    profiles = load_profiles(args.tool)
+    if args.pacing not in profiles:
+        print(f"Unknown pacing profile '{args.pacing}': available are {', '.join(profiles)}")
+        return None
+    return profiles[args.pacing]
+
+
+def batch_plan(args):
+    """
+    Convert and plan every image, without drawing.
+    """
+    size = canvas_size(args)
+    pacing = pacing_profile(args)
+    if size is None or pacing is None:
+        return
+    paths = find_images(args.images)
+    if not paths:
+        print("No images found")
+        return
+
+    start = time.perf_counter()
+    print(f"{'image':<28}{'strokes':>9}{'switches':>10}{'draw s':>8}{'decode':>8}{'resize':>8}{'quantize':>10}{'plan':>8}  (ms)")
+    with JobQueue(paths, *size, job_options(args), args.workers) as jobs:
+        for job in jobs:
+            name = os.path.basename(job.path)[:27]
+            if job.error:
+                print(f"{name:<28}{job.error}")
+                continue
+            ms = {phase: f"{seconds * 1000:.0f}" for phase, seconds in job.phases.items()}
+            print(f"{name:<28}{job.program.drag_count:>9}{job.program.color_change_count:>10}"
+                  f"{estimate_draw_time(job.program, pacing):>8.0f}{ms.get('decode', '-'):>8}{ms.get('resize', '-'):>8}"
+                  f"{ms.get('quantize', 'cached'):>10}{ms.get('plan', '-'):>8}")
+    print(f"{len(paths)} images prepared in {time.perf_counter() - start:.1f}s")
+
+
+def print_progress(trace: DrawTrace):
+    eta = trace.eta
+    print(f"\r  {trace.fraction:.0%} drawn" + (f", about {eta:.0f}s left " if eta is not None else ""),
+          end="\n" if trace.done else "", flush=True)
+
+
+def batch_draw(args):
+    """
+    Draw every image, asking before each one or back to back.
+    """
+    from utils.automations import execute_stroke_program
+
+    layout = load_calibration(args.calibration)
+    if layout is None:
+        print("No calibration saved: run 'python batch.py calibrate' or set the areas in the app first")
+        return
+    pacing = pacing_profile(args)
+    if pacing is None:
+        return
+    paths = find_images(args.images)
+    if not paths:
+        print("No images found")
+        return
+    drawing_bbox = layout["drawing_bbox"]
+    options = job_options(args)
+
+    with JobQueue(paths, drawing_bbox["width"], drawing_bbox["height"], options, args.workers) as jobs:
+        for number, job in enumerate(jobs, 1):
+            name = os.path.basename(job.path)
+            if job.error:
+                print(f"[{number}/{len(jobs)}] {name}: skipped, {job.error}")
+                continue
+
+            about = (f"[{number}/{len(jobs)}] {name}: {job.program.drag_count} strokes, about "
+                     f"{estimate_draw_time(job.program, pacing):.0f}s ({jobs.ready()} of {len(jobs)} images prepared)")
+            if args.back_to_back:
+                if number > 1:
+                    time.sleep(args.gap)
+                print(about)
+            else:
+                answer = input(f"{about}\n  Enter = draw, s = skip, q = quit: ").strip().lower()
+                if answer == "q":
+                    break
+                if answer == "s":
+                    continue
+
+            settings = {"mode": "batch", "image": name, **asdict(options), "pacing": args.pacing, "verify": args.verify,
+                        "width": drawing_bbox["width"], "height": drawing_bbox["height"]}
+            trace = DrawTrace(settings, on_progress=print_progress)
+            trace.phases.update(job.phases)
+            session = DrawingSession.start(job.program)
+            execute_stroke_program(job.program, layout["palette_xys"], drawing_bbox, pacing=pacing,
+                                   session=session, verify=args.verify, trace=trace)
+            trace.reports["order"] = job.report
+            save_trace(trace)
+            if not session.done:
+                print("Stopped with 'q': the rest of the batch is cancelled (the app can resume this drawing)")
+                break
+
+
+def main():
+    parser = argparse.ArgumentParser(description="GarticPainter batch drawing")
+    parser.add_argument("--calibration", default=CALIBRATION_FILE, help="Saved canvas and palette layout")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    calibrate = sub.add_parser("calibrate", help="Detect the canvas and palette on screen and save them")
+    calibrate.add_argument("--delay", type=float, default=3.0, help="Seconds to switch to Gartic Phone")
+    calibrate.set_defaults(func=batch_calibrate)
+
+    # Conversion and planning options, shared by plan and draw
+    images = argparse.ArgumentParser(add_help=False)
+    images.add_argument("images", nargs="+", help="Image files and/or directories of images")
+    images.add_argument("--tool", choices=["pen", "box"], default="pen")
+    images.add_argument("--details", type=int, default=9, help="Image detail level, like the app slider (1-10)")
+    images.add_argument("--step", type=int, default=2, help="Drawing step, like the app slider")
+    images.add_argument("--dither", choices=DITHER_MODES, default="none")
+    images.add_argument("--rectangles", action="store_true", help="Merge box rows into rectangles (box tool)")
+    images.add_argument("--group-colors", action="store_true", help="Draw each color in one pass")
+    images.add_argument("--optimize-travel", action="store_true", help="Reorder strokes to cut cursor travel")
+    images.add_argument("--pacing", default="classic", help="Pacing profile name (see utils.pacing)")
+    images.add_argument("--workers", type=int, default=default_workers(), help="Processes preparing images")
+
+    plan = sub.add_parser("plan", parents=[images], help="Convert and plan images without drawing")
+    plan.add_argument("--width", type=int, default=None, help="Canvas width (default: the calibrated canvas)")
+    plan.add_argument("--height", type=int, default=None, help="Canvas height (default: the calibrated canvas)")
+    plan.set_defaults(func=batch_plan)
+
+    draw = sub.add_parser("draw", parents=[images], help="Draw images one after another. Press 'q' to stop.")
+    draw.add_argument("--back-to-back", action="store_true", help="Don't ask before each image")
+    draw.add_argument("--gap", type=float, default=5.0, help="Seconds between back-to-back drawings")
+    draw.add_argument("--verify", action="store_true", help="Verify & repair while drawing (see utils.verify)")
+    draw.set_defaults(func=batch_draw)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,503 @@
+"""
+Benchmarks for the drawing engine. Runs headless, no game window needed.
+
+Usage:
+    python benchmark.py [--width 800] [--height 600] [--details 9] [--step 2] drags
+    python benchmark.py [...] rects [--steps 1 2 4]   (exits with status 1 on a mismatch)
+    python benchmark.py [...] travel
+    python benchmark.py [...] sim [--image coffee] [--steps 1 2 4] [--pacing classic] [--trace-dir temp/traces]
+    python benchmark.py [...] quantize [--max-workers N]
+    python benchmark.py [...] dither [--blur 3]
+    python benchmark.py [...] budget [--image coffee] [--seconds 30 60 120] [--pacing classic]
+    python benchmark.py [...] capture [--frames 200]   (needs a display)
+    python benchmark.py [...] verify [--image coffee] [--pacing turbo] [--min-hold 0.003]
+    python benchmark.py [...] diff [--image coffee] [--pen-widths 4 5]
+    python benchmark.py startup [--repeats 5] [--reruns 20]   (reruns need streamlit)
+"""
+import argparse
+import importlib.util
+import statistics
+import subprocess
+import sys
+import time
+import types
+import cv2 as cv
+import numpy as np
+from skimage import data
+from utils.image import resize_img
+from utils.color import to_gartic_labels, render_labels, bgr_to_lab, screen_gartic_labels
+from utils.strokes import plan_box_strokes, plan_box_rectangles, plan_pen_strokes, plan_strokes, group_by_color, box_expand
+from utils.ordering import optimize_travel, travel_stats, arrange_strokes
+from utils.color import gartic_color_names
+from utils.backends import SimulatedBackend
+from utils.executor import run_stroke_program
+from utils.pacing import load_profiles, estimate_draw_time
+from utils.budget import fit_labels_to_budget
+from utils.parallel import parallel_gartic_labels, default_workers
+from utils.dither import DITHER_MODES
+from utils.verify import run_verified_program
+from utils.diff import plan_diff_strokes
+from utils.telemetry import DrawTrace, save_trace
+from skimage.color import deltaE_ciede2000
+
+
+def sample_images() -> dict:
+    """
+    A small set of BGR test images: photos bundled with scikit-image plus a flat-color drawing.
+
+    Returns:
+        dict: Mapping of image name to BGR image.
+    """
+    images = {
+        name: cv.cvtColor(getattr(data, name)(), cv.COLOR_RGB2BGR)
+        for name in ("astronaut", "coffee", "chelsea", "rocket")
+    }
+
+    # Cartoon-like image: big flat shapes, the typical Gartic prompt
+    cartoon = np.full((600, 800, 3), 255, dtype=np.uint8)
+    cv.rectangle(cartoon, (50, 50), (350, 300), (38, 193, 255), -1)
+    cv.circle(cartoon, (550, 250), 150, (19, 0, 255), -1)
+    cv.ellipse(cartoon, (400, 480), (300, 80), 0, 0, 360, (60, 176, 17), -1)
+    cv.putText(cartoon, "GARTIC", (120, 200), cv.FONT_HERSHEY_SIMPLEX, 3, (0, 0, 0), 12)
+    images["cartoon"] = cartoon
+
+    return images
+
+
+def load_labels(width: int, height: int, details: int) -> dict:
+    """
+    Resize and quantize every sample image like the app does.
+    """
+    return {
+        name: to_gartic_labels(resize_img(img, width, height), step=11 - details)
+        for name, img in sample_images().items()
+    }
+
+
+def bench_drags(args):
+    """
+    Drag counts of the row-by-row box planner vs. rectangle merging, and the pen planner.
+    """
+    print(f"{'image':<12}{'box rows':>12}{'rectangles':>12}{'ratio':>8}{'pen':>10}{'plan ms':>10}")
+    for name, labels in load_labels(args.width, args.height, args.details).items():
+        start = time.perf_counter()
+        rows = plan_box_strokes(labels, args.step).drag_count
+        rects = plan_box_rectangles(labels, args.step).drag_count
+        pen = plan_pen_strokes(labels, args.step).drag_count
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f"{name:<12}{rows:>12}{rects:>12}{rows / max(rects, 1):>7.1f}x{pen:>10}{elapsed:>10.1f}")
+
+
+def stepped_columns(width: int = 40, height: int = 40) -> np.ndarray:
+    """
+    A tall black column with a shorter red block on its left, starting lower down: the
+    layout where a later rectangle's overlap can cover an earlier one.
+    """
+    labels = np.full((height, width), gartic_color_names.index("white"), dtype=np.uint8)
+    labels[:, width // 2:width // 2 + width // 4] = gartic_color_names.index("black")
+    labels[height // 2:, :width // 2] = gartic_color_names.index("red")
+    return labels
+
+
+def bench_rects(args):
+    """
+    Check that merged rectangles paint the same pixels as the row-by-row box planner on the
+    simulated canvas (both unexpanded), and compare their accuracy with expanded box rows.
+    Exits with status 1 if any pixel differs.
+    """
+    images = load_labels(args.width, args.height, args.details)
+    images["stepped"] = stepped_columns()
+    mismatches = 0
+    print(f"{'image':<12}{'step':>5}{'box rows':>10}{'rectangles':>12}{'differ px':>11}{'rows acc':>10}{'rect acc':>10}")
+    for name, labels in images.items():
+        drawing_bbox, palette_xys = simulated_screen(labels.shape[1], labels.shape[0])
+        for step in args.steps:
+            canvases = []
+            for program in (plan_box_strokes(labels, step), plan_box_strokes(labels, step, expand=0),
+                            plan_box_rectangles(labels, step)):
+                backend = SimulatedBackend(drawing_bbox, palette_xys, "box")
+                run_stroke_program(program, backend, palette_xys, drawing_bbox)
+                canvases.append(backend)
+            rows, reference, rects = canvases
+            differ = int(np.count_nonzero(rects.canvas != reference.canvas))
+            mismatches += differ > 0
+            print(f"{name:<12}{step:>5}{rows.drags:>10}{rects.drags:>12}{differ:>11}"
+                  f"{rows.accuracy(labels):>10.1%}{rects.accuracy(labels):>10.1%}")
+    if mismatches:
+        sys.exit(1)
+
+
+def bench_travel(args):
+    """
+    Cursor travel of color-grouped programs before and after optimize_travel.
+    """
+    print(f"{'image':<12}{'drags':>9}{'travel px':>12}{'optimized':>12}{'long':>7}{'-> long':>9}{'seconds':>9}")
+    for name, labels in load_labels(args.width, args.height, args.details).items():
+        program = group_by_color(plan_box_strokes(labels, args.step))
+        start = time.perf_counter()
+        optimized = optimize_travel(program, time_budget=args.budget)
+        elapsed = time.perf_counter() - start
+        before, after = travel_stats(program), travel_stats(optimized)
+        print(f"{name:<12}{before['drags']:>9}{before['travel']:>12.0f}{after['travel']:>12.0f}"
+              f"{before['long_moves']:>7}{after['long_moves']:>9}{elapsed:>9.2f}")
+
+
+# (name, tool, merge rectangles, group colors, optimize travel)
+SIM_MODES = [
+    ("box", "box", False, False, False),
+    ("box+group", "box", False, True, False),
+    ("rect", "box", True, False, False),
+    ("rect+group+travel", "box", True, True, True),
+    ("pen", "pen", False, False, False),
+    ("pen+group+travel", "pen", False, True, True),
+]
+
+
+def simulated_screen(width: int, height: int) -> tuple:
+    """
+    A made-up screen layout: palette column on the left, drawing area next to it.
+
+    Returns:
+        tuple: (drawing_bbox, palette_xys)
+    """
+    drawing_bbox = {"width": width, "height": height, "left": 200, "top": 100,
+                    "right": 200 + width, "bottom": 100 + height}
+    palette_xys = {
+        name: (20 + (i % 3) * 40, 100 + (i // 3) * 40)
+        for i, name in enumerate(gartic_color_names)
+    }
+    return drawing_bbox, palette_xys
+
+
+def simulated_capture(backend: SimulatedBackend, drawing_bbox: dict):
+    """
+    capture(bbox) over the simulated canvas, for boxes inside the drawing area.
+    """
+    def capture(bbox: dict) -> np.ndarray:
+        top, left = bbox["top"] - drawing_bbox["top"], bbox["left"] - drawing_bbox["left"]
+        return render_labels(backend.canvas[top:top + bbox["height"], left:left + bbox["width"]])
+    return capture
+
+
+def bench_sim(args):
+    """
+    Draw one image on the simulated canvas with every mode/step setting, optionally
+    saving a trace of each run (see utils.telemetry) to compare them.
+    """
+    img = sample_images()[args.image]
+    prep = DrawTrace()
+    with prep.phase("resize"):
+        img = resize_img(img, args.width, args.height)
+    with prep.phase("quantize"):
+        labels = to_gartic_labels(img, step=11 - args.details)
+    drawing_bbox, palette_xys = simulated_screen(args.width, args.height)
+
+    print(f"{'mode':<20}{'step':>5}{'drags':>9}{'events':>10}{'switches':>10}{'dropped':>9}"
+          f"{'sim time':>10}{'accuracy':>10}{'plan ms':>9}")
+    for name, tool, rectangles, group_colors, optimize in SIM_MODES:
+        for step in args.steps:
+            trace = DrawTrace({"mode": name, "tool": tool, "step": step, "details": args.details, "pacing": args.pacing,
+                               "group_colors": group_colors, "rectangles": rectangles, "optimize_travel": optimize,
+                               "width": args.width, "height": args.height})
+            trace.phases.update(prep.phases)
+            with trace.phase("plan"):
+                expand = box_expand(rectangles, group_colors)
+                program = plan_strokes(labels, tool, step, rectangles, expand)
+                program, _ = arrange_strokes(program, group_colors, optimize, time_budget=args.budget)
+            plan_ms = trace.phases["plan"] * 1000
+
+            backend = SimulatedBackend(drawing_bbox, palette_xys, tool, pen_width=args.pen_width,
+                                       min_hold=args.min_hold, min_color_settle=args.min_settle)
+            pacing = load_profiles(tool)[args.pacing]
+            trace.start_program(len(program.ops))
+            with trace.phase("draw"):
+                run_stroke_program(program, backend, palette_xys, drawing_bbox, pacing=pacing,
+                                   progress=trace.update_progress, trace=trace)
+            if args.trace_dir:
+                trace.reports["simulated"] = {"seconds": backend.clock, "events": backend.events,
+                                              "dropped": backend.dropped, "accuracy": backend.accuracy(labels)}
+                save_trace(trace, args.trace_dir)
+            print(f"{name:<20}{step:>5}{backend.drags:>9}{backend.events:>10}{backend.palette_switches:>10}{backend.dropped:>9}"
+                  f"{backend.clock:>9.1f}s{backend.accuracy(labels):>9.1%}{plan_ms:>9.0f}")
+
+
+def bench_verify(args):
+    """
+    Open vs. closed loop on a simulated game that drops inputs faster than it can take:
+    each tool drawn with plain pacing, then verified against captures of the simulated canvas.
+    """
+    img = sample_images()[args.image]
+    labels = to_gartic_labels(resize_img(img, args.width, args.height), step=11 - args.details)
+    drawing_bbox, palette_xys = simulated_screen(args.width, args.height)
+
+    print(f"{'mode':<20}{'loop':>8}{'dropped':>9}{'redrawn':>9}{'sim time':>10}{'accuracy':>10}{'delays':>8}")
+    for name, tool, rectangles, group_colors, optimize in SIM_MODES:
+        expand = box_expand(rectangles, group_colors)
+        program, _ = arrange_strokes(plan_strokes(labels, tool, args.step, rectangles, expand), group_colors, optimize)
+        reference = SimulatedBackend(drawing_bbox, palette_xys, tool)
+        run_stroke_program(program, reference, palette_xys, drawing_bbox)
+        pacing = load_profiles(tool)[args.pacing]
+
+        for loop in ("open", "closed"):
+            backend = SimulatedBackend(drawing_bbox, palette_xys, tool, min_hold=args.min_hold, min_color_settle=args.min_settle)
+            if loop == "open":
+                run_stroke_program(program, backend, palette_xys, drawing_bbox, pacing=pacing)
+                redrawn, factor = 0, 1.0
+            else:
+                report = run_verified_program(program, backend, palette_xys, drawing_bbox,
+                                              simulated_capture(backend, drawing_bbox), pacing=pacing)
+                redrawn, factor = report["redrawn"], report["pacing_factor"]
+            print(f"{name:<20}{loop:>8}{backend.dropped:>9}{redrawn:>9}{backend.clock:>9.1f}s"
+                  f"{backend.accuracy(reference.canvas):>9.1%}{factor:>7.2f}x")
+
+
+def bench_diff(args):
+    """
+    Strokes the diff planner plans on a canvas drawn by a pen of another width than
+    PEN_WIDTH: nearly none once the drawing is done, about half of them when half of it is.
+    """
+    img = sample_images()[args.image]
+    labels = to_gartic_labels(resize_img(img, args.width, args.height), step=11 - args.details)
+    drawing_bbox, palette_xys = simulated_screen(args.width, args.height)
+    program = plan_strokes(labels, "pen", args.step)
+    white = gartic_color_names.index("white")
+
+    print(f"{'pen width':>9}{'drawn':>8}{'planned':>9}{'of':>7}{'accuracy':>10}{'after':>8}{'plan ms':>9}")
+    for pen_width in args.pen_widths:
+        for drawn in (1.0, 0.5):
+            backend = SimulatedBackend(drawing_bbox, palette_xys, "pen", pen_width=pen_width)
+            run_stroke_program(program, backend, palette_xys, drawing_bbox)
+            backend.canvas[int(args.height * drawn):] = white
+            before = backend.accuracy(labels)
+
+            start = time.perf_counter()
+            canvas = screen_gartic_labels(simulated_capture(backend, drawing_bbox)(drawing_bbox))
+            repair = plan_diff_strokes(labels, canvas, "pen", args.step)
+            plan_ms = (time.perf_counter() - start) * 1000
+            run_stroke_program(repair, backend, palette_xys, drawing_bbox)
+            print(f"{pen_width:>9}{drawn:>8.0%}{repair.drag_count:>9}{program.drag_count:>7}"
+                  f"{before:>9.1%}{backend.accuracy(labels):>7.1%}{plan_ms:>9.0f}")
+
+
+def bench_quantize(args):
+    """
+    Scaling of the CIEDE2000 quantizer (lookup table off) over 1..N worker processes.
+    """
+    img = resize_img(sample_images()["coffee"], args.width, args.height)
+    reference = parallel_gartic_labels(img, workers=1, use_lut=False)
+
+    print(f"{'workers':>8}{'seconds':>10}{'speedup':>10}{'identical':>11}")
+    base = None
+    for workers in range(1, args.max_workers + 1):
+        parallel_gartic_labels(img[:256], workers=workers, use_lut=False)  # Warm up the pool
+        start = time.perf_counter()
+        labels = parallel_gartic_labels(img, workers=workers, use_lut=False)
+        elapsed = time.perf_counter() - start
+        base = base or elapsed
+        print(f"{workers:>8}{elapsed:>10.2f}{base / elapsed:>9.1f}x{str(bool((labels == reference).all())):>11}")
+
+
+def bench_dither(args):
+    """
+    Quality and cost of each dithering mode: CIEDE2000 error of the blurred result
+    against the blurred image (roughly what the eye sees from afar) and box drags.
+    """
+    print(f"{'image':<12}{'mode':<17}{'seconds':>9}{'error':>8}{'drags':>9}")
+    step = 11 - args.details
+    for name, img in sample_images().items():
+        img = resize_img(img, args.width, args.height)
+        for mode in DITHER_MODES:
+            start = time.perf_counter()
+            labels = to_gartic_labels(img, step=step, dither=mode)
+            elapsed = time.perf_counter() - start
+            error = blurred_error(img, labels, args.blur)
+            drags = plan_box_strokes(labels, args.step).drag_count
+            print(f"{name:<12}{mode:<17}{elapsed:>9.2f}{error:>8.2f}{drags:>9}")
+
+
+def blurred_error(img: np.ndarray, labels: np.ndarray, blur: float = 3.0) -> float:
+    """
+    Mean CIEDE2000 error between an image and its palette rendering, both blurred
+    (roughly what the eye sees from afar).
+    """
+    target = bgr_to_lab(cv.GaussianBlur(img, (0, 0), blur))
+    seen = bgr_to_lab(cv.GaussianBlur(render_labels(labels), (0, 0), blur))
+    return float(deltaE_ciede2000(target, seen).mean())
+
+
+def bench_budget(args):
+    """
+    Image quality at a fixed drawing time: the draw-cost-aware quantizer vs. the
+    finest detail level that fits the same budget (box tool, simulated pacing model).
+    """
+    img = resize_img(sample_images()[args.image], args.width, args.height)
+    pacing = load_profiles("box")[args.pacing]
+
+    print(f"{'budget s':>9}{'detail':>8}{'est s':>8}{'error':>8}{'fitted s':>10}{'error':>8}{'penalty':>9}{'fit ms':>8}")
+    for seconds in args.seconds:
+        # Detail slider: the finest sampling step that fits
+        for details in range(10, 0, -1):
+            labels = to_gartic_labels(img, step=11 - details)
+            estimate = estimate_draw_time(plan_strokes(labels, "box", args.step), pacing)
+            if estimate <= seconds:
+                break
+        slider_error = blurred_error(img, labels)
+
+        start = time.perf_counter()
+        fitted, report = fit_labels_to_budget(img, 11 - args.details, seconds, "box", args.step, pacing)
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f"{seconds:>9g}{details:>8}{estimate:>8.1f}{slider_error:>8.2f}"
+              f"{report['estimated_seconds']:>10.1f}{blurred_error(img, fitted):>8.2f}{report['penalty']:>9.1f}{elapsed:>8.0f}")
+
+
+# Modules the app imports, and the heavy dependencies that should only load when a button needs them
+STARTUP_MODULES = ["utils.color", "utils.dither", "utils.budget", "utils.cache", "utils.session", "utils.automations"]
+HEAVY_MODULES = ["skimage", "scipy", "pynput", "pyautogui", "mss", "win32api"]
+
+
+def bench_startup(args):
+    """
+    Import time of the app's modules, each in a fresh interpreter, with the heavy
+    dependencies they load; then how long the Streamlit app takes to run the first time
+    and on every rerun (every widget change reruns main.py).
+    """
+    probe = ("import sys, time; start = time.perf_counter(); import {module}; "
+             "print((time.perf_counter() - start) * 1000, *[m for m in {heavy} if m in sys.modules])")
+
+    print(f"{'module':<22}{'import ms':>10}  heavy dependencies loaded")
+    for module in STARTUP_MODULES:
+        times = []
+        for _ in range(args.repeats):
+            result = subprocess.run([sys.executable, "-c", probe.format(module=module, heavy=HEAVY_MODULES)],
+                                    capture_output=True, text=True)
+            if result.returncode != 0:
+                break
+            elapsed, *loaded = result.stdout.split()
+            times.append(float(elapsed))
+        if not times:
+            print(f"{module:<22}{'failed':>10}  {result.stderr.strip().splitlines()[-1]}")
+            continue
+        print(f"{module:<22}{statistics.median(times):>10.0f}  {', '.join(loaded) or '-'}")
+
+    try:
+        from streamlit.testing.v1 import AppTest
+    except ImportError:
+        print("\nstreamlit is not installed: rerun latency skipped")
+        return
+
+    # main.py imports winsound for its beeps, which only exists on Windows: a silent
+    # stand-in lets the app run here (the beeps are only played by button callbacks)
+    if importlib.util.find_spec("winsound") is None:
+        winsound = types.ModuleType("winsound")
+        winsound.Beep = lambda frequency, duration: None
+        sys.modules["winsound"] = winsound
+
+    app = AppTest.from_file("main.py", default_timeout=60)
+    start = time.perf_counter()
+    app.run()
+    first = (time.perf_counter() - start) * 1000
+    if app.exception:
+        print(f"\nmain.py failed: {app.exception[0].message}")
+        return
+    reruns = []
+    for _ in range(args.reruns):
+        start = time.perf_counter()
+        app.run()
+        reruns.append((time.perf_counter() - start) * 1000)
+    print(f"\nfirst run {first:.0f} ms, rerun median {statistics.median(reruns):.0f} ms, max {max(reruns):.0f} ms")
+
+
+def bench_capture(args):
+    """
+    Screen region grabs per second: a new mss handle per call and a copied, alpha-stripped
+    array (the old screenshot_region_numpy) vs. the persistent capture service.
+    """
+    import mss
+    from utils.capture import CaptureService
+
+    def fresh_handle():
+        with mss.mss() as sct:
+            shot = sct.grab({"left": 0, "top": 0, "width": args.width, "height": args.height})
+            return np.array(shot)[:, :, :3]
+
+    service = CaptureService()
+    buffer = np.empty((args.height, args.width, 3), dtype=np.uint8)
+    ways = {
+        "mss per call": fresh_handle,
+        "service view": lambda: service.grab(0, 0, args.width, args.height),
+        "service into buffer": lambda: service.grab_into(buffer, 0, 0),
+    }
+
+    print(f"{'capture':<22}{'frames/s':>10}{'ms/frame':>10}")
+    for name, grab in ways.items():
+        grab()  # Warm up
+        start = time.perf_counter()
+        for _ in range(args.frames):
+            grab()
+        elapsed = time.perf_counter() - start
+        print(f"{name:<22}{args.frames / elapsed:>10.1f}{elapsed / args.frames * 1000:>10.2f}")
+    service.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="GarticPainter drawing engine benchmarks")
+    parser.add_argument("--width", type=int, default=800)
+    parser.add_argument("--height", type=int, default=600)
+    parser.add_argument("--details", type=int, default=9, help="Image detail level, like the app slider (1-10)")
+    parser.add_argument("--step", type=int, default=2, help="Drawing step, like the app slider")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("drags", help="Drag counts per planner").set_defaults(func=bench_drags)
+    rects = sub.add_parser("rects", help="Check that merged rectangles paint the same pixels as box rows")
+    rects.add_argument("--steps", type=int, nargs="+", default=[1, 2, 4], help="Drawing steps to try")
+    rects.set_defaults(func=bench_rects)
+    travel = sub.add_parser("travel", help="Cursor travel before/after the travel optimizer")
+    travel.add_argument("--budget", type=float, default=2.0, help="2-opt time budget in seconds")
+    travel.set_defaults(func=bench_travel)
+    sim = sub.add_parser("sim", help="Draw on the simulated canvas: events, time, switches, accuracy")
+    sim.add_argument("--image", default="coffee", help="Sample image name")
+    sim.add_argument("--steps", type=int, nargs="+", default=[1, 2, 4], help="Drawing steps to try")
+    sim.add_argument("--pen-width", type=int, default=4, help="Simulated pen thickness in pixels")
+    sim.add_argument("--budget", type=float, default=1.0, help="2-opt time budget in seconds")
+    sim.add_argument("--pacing", default="classic", help="Pacing profile name (see utils.pacing)")
+    sim.add_argument("--min-hold", type=float, default=0.0, help="Simulated game drops drags held shorter than this")
+    sim.add_argument("--min-settle", type=float, default=0.0, help="Simulated game drops color clicks followed faster than this")
+    sim.add_argument("--trace-dir", default=None, help="Save a trace of every run here (runs.csv + one JSON each)")
+    sim.set_defaults(func=bench_sim)
+    quantize = sub.add_parser("quantize", help="Quantizer scaling over worker processes")
+    quantize.add_argument("--max-workers", type=int, default=default_workers())
+    quantize.set_defaults(func=bench_quantize)
+    dither = sub.add_parser("dither", help="Blurred color error and drags per dithering mode")
+    dither.add_argument("--blur", type=float, default=3.0, help="Gaussian blur sigma applied before comparing")
+    dither.set_defaults(func=bench_dither)
+    budget = sub.add_parser("budget", help="Image quality at a fixed drawing time: cost-aware quantizer vs. detail slider")
+    budget.add_argument("--image", default="coffee", help="Sample image name")
+    budget.add_argument("--seconds", type=float, nargs="+", default=[30, 60, 120], help="Drawing time budgets")
+    budget.add_argument("--pacing", default="classic", help="Pacing profile name (see utils.pacing)")
+    budget.set_defaults(func=bench_budget)
+    capture = sub.add_parser("capture", help="Screen grabs per second of a --width x --height region (needs a display)")
+    capture.add_argument("--frames", type=int, default=200)
+    capture.set_defaults(func=bench_capture)
+
+    verify = sub.add_parser("verify", help="Simulated drawing with dropped inputs, without and with verify & repair")
+    verify.add_argument("--image", default="coffee", help="Sample image name")
+    verify.add_argument("--pacing", default="turbo", help="Starting pacing profile (see utils.pacing)")
+    verify.add_argument("--min-hold", type=float, default=0.003, help="Simulated game drops drags held shorter than this")
+    verify.add_argument("--min-settle", type=float, default=0.002, help="Simulated game drops color clicks followed faster than this")
+    verify.set_defaults(func=bench_verify)
+
+    diff = sub.add_parser("diff", help="Strokes planned by the diff planner over a canvas drawn by a wider or thinner pen")
+    diff.add_argument("--image", default="coffee", help="Sample image name")
+    diff.add_argument("--pen-widths", type=int, nargs="+", default=[4, 5], help="Pen widths of the simulated game")
+    diff.set_defaults(func=bench_diff)
+
+    startup = sub.add_parser("startup", help="Import time of the app's modules and Streamlit rerun latency")
+    startup.add_argument("--repeats", type=int, default=5, help="Fresh interpreters per module")
+    startup.add_argument("--reruns", type=int, default=20, help="App reruns to time")
+    startup.set_defaults(func=bench_startup)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
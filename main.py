@@ -1,11 +1,25 @@
 import streamlit as st
 from PIL import Image
 from utils.image import to_opencv_img, resize_img, denoise_image_preserve_color
-from utils.color import to_gartic_colors
+from utils.color import to_gartic_labels, render_labels, get_gartic_palette_lab, get_gartic_lut
 from utils.automations import get_border_clicks, get_bbox_from_clicks, screenshot_region_numpy, get_gartic_colors_palette
-from utils.automations import test_color_palette, draw_img_with_pen, draw_img_with_box
+from utils.automations import test_color_palette, draw_img_with_pen, draw_img_with_box, draw_img_streaming, resume_drawing
+from utils.automations import draw_img_diff, detect_gartic_layout
+from utils.backends import get_input_backend
+from utils.capture import get_capture_service
+from utils.pacing import load_profiles, save_profile, calibrate_pacing
+from utils.parallel import default_workers
+from utils.dither import DITHER_MODES
+from utils.budget import fit_labels_to_budget
+from utils.cache import content_hash, cache_key, load_labels, save_labels
+from utils.session import DrawingSession
+from utils.telemetry import DrawTrace, save_trace
+from utils.detect import CALIBRATION_FILE, save_calibration, load_calibration
 import numpy as np
 import cv2 as cv
+import importlib
+import os
+import threading
 import time
 import winsound
 
@@ -15,17 +29,51 @@ TEMP_DIR = "temp"
 with open("version.txt", "r") as f:
     VERSION = f.read()
 
+# Load what the buttons need once per server, in the background, so the page shows right away:
+# scikit-image and the palette tables for converting, the input and capture backends and pynput for drawing
+@st.cache_resource
+def preload_resources():
+    steps = [get_gartic_palette_lab, get_gartic_lut, get_input_backend, get_capture_service]
+    for module in ("pynput.keyboard", "pynput.mouse"):  # Warm-up: the stop listener and clicks import them
+        steps.append(lambda module=module: importlib.import_module(module))
+
+    def preload():
+        # A failing step only costs its own warm-up: the button that needs it raises the error later
+        for step in steps:
+            try:
+                step()
+            except Exception as e:
+                print(f"Preload failed: {e!r}")
+
+    thread = threading.Thread(target=preload, daemon=True)
+    thread.start()
+    return thread
+
+preload_resources()
+
 # Initialize session state variables if not present
 st.session_state.setdefault("drawing_bbox", None)
 st.session_state.setdefault("colors_bbox", None)
 st.session_state.setdefault("drawing_area_img", None)
 st.session_state.setdefault("colors_area_img", None)
 st.session_state.setdefault("gartic_palette_xy", None)
-st.session_state.setdefault("gartic_img", None)
+st.session_state.setdefault("gartic_labels", None)
+st.session_state.setdefault("order_report", None)
+st.session_state.setdefault("source_img", None)
+st.session_state.setdefault("budget_report", None)
+st.session_state.setdefault("image_key", None)
+st.session_state.setdefault("labels_key", None)
+st.session_state.setdefault("prep_phases", {})
+st.session_state.setdefault("draw_trace", None)
 
 # Title with version info
 st.title(f"GarticPhone Cheat ({VERSION})")
 
+# Save the areas once both are known, to reuse them later (see utils.detect.save_calibration)
+def save_current_calibration():
+    save_calibration({"drawing_bbox": st.session_state.drawing_bbox, "colors_bbox": st.session_state.colors_bbox,
+                      "palette_xys": st.session_state.gartic_palette_xy})
+
 # Function to set the drawing bounding box by capturing 2 mouse clicks
 def set_drawing_bbox():
     time.sleep(2)  # Wait before starting
@@ -43,6 +91,7 @@ def set_colors_bbox():
     colors_bbox = get_bbox_from_clicks(colors_bbox)
     st.session_state.colors_bbox = colors_bbox
     st.session_state.gartic_palette_xy = get_gartic_colors_palette(colors_bbox)
+    save_current_calibration()
     winsound.Beep(800, 50)
 
 # Test color palette by clicking on all detected palette positions
@@ -52,6 +101,36 @@ def test_color_palette_onclick():
     test_color_palette(st.session_state.gartic_palette_xy)
     winsound.Beep(800, 50)
 
+# Find canvas and palette in one screenshot instead of clicking their corners
+def auto_detect_onclick():
+    time.sleep(2)
+    layout = detect_gartic_layout()
+    if layout is None:
+        winsound.Beep(400, 300)  # Low beep: not found
+        return
+    st.session_state.drawing_bbox = layout["drawing_bbox"]
+    st.session_state.colors_bbox = layout["colors_bbox"]
+    st.session_state.gartic_palette_xy = layout["palette_xys"]
+    save_current_calibration()
+    winsound.Beep(800, 50)
+
+# Reuse the areas of an earlier session (also what batch.py draws with)
+def load_calibration_onclick():
+    layout = load_calibration()
+    st.session_state.drawing_bbox = layout["drawing_bbox"]
+    st.session_state.colors_bbox = layout["colors_bbox"]
+    st.session_state.gartic_palette_xy = layout["palette_xys"]
+
+st.button("🪄 Auto-Detect Canvas & Palette",
+          help="After clicking, switch to Gartic Phone within 2 seconds with an EMPTY canvas and the whole palette visible. "
+               "The drawing area and the colors are found automatically (a low beep means they weren't).",
+          on_click=auto_detect_onclick, disabled=st.session_state.drawing_bbox is not None)
+
+st.button("📂 Use Saved Calibration",
+          help="Uses the drawing area and palette from the last time they were set. Gartic Phone must be at the same place on screen.",
+          on_click=load_calibration_onclick,
+          disabled=st.session_state.drawing_bbox is not None or not os.path.exists(CALIBRATION_FILE))
+
 # Button to set drawing bounding box, disabled if already set
 st.button("🎯 Set Drawing Area",
           help=("After the beep, click this button and then click on the TWO INNER corners of the drawing canvas on Gartic Phone.\n"
@@ -102,25 +181,43 @@ uploaded_img_el = st.file_uploader("📷 Upload Drawing Image", type=["jpg", "jp
                        help="Upload the image you want the bot to draw on the Gartic canvas.",
                        disabled=not st.session_state.drawing_bbox or not st.session_state.colors_bbox)
 
+# Dithering: mix palette colors to fake the shades the palette lacks
+dither_el = st.selectbox("🌫️ Dithering", DITHER_MODES,
+                         help="Patterns of palette colors that approximate missing shades. 'stroke-aware' keeps longer same-color runs, "
+                              "so it draws much faster than the other modes. Dithered images need more strokes than 'none'.")
+
 # Resize + convert uploaded image to Gartic palette
 def process_uploaded_image():
     print("processsing")
     step = 11 - details_el.numerator  # Determine color step size based on detail level
+    trace = DrawTrace()  # Times of the steps before drawing, added to the next drawing's trace
     with st.spinner("📏 Resizing image to fit drawing area..."):
         img_data = uploaded_img_el.getbuffer()
-        img = to_opencv_img(img_data)
-        img = resize_img(img, st.session_state.drawing_bbox["width"], st.session_state.drawing_bbox["height"])
-    with st.spinner("🎨 Converting image to Gartic color palette..."):
-        gartic_img = to_gartic_colors(img, step=step)
-        st.session_state.gartic_img = gartic_img
+        with trace.phase("decode"):
+            img = to_opencv_img(img_data)
+        with trace.phase("resize"):
+            img = resize_img(img, st.session_state.drawing_bbox["width"], st.session_state.drawing_bbox["height"])
+        st.session_state.source_img = img
+        st.session_state.budget_report = None
+
+    # Same file, canvas size and settings as before: reuse the converted image from disk
+    st.session_state.image_key = cache_key(content_hash(img_data), img.shape[1], img.shape[0])
+    st.session_state.labels_key = cache_key(st.session_state.image_key, step, dither_el)
+    labels = load_labels(st.session_state.labels_key)
+    if labels is None:
+        with st.spinner("🎨 Converting image to Gartic color palette..."), trace.phase("quantize"):
+            labels = to_gartic_labels(img, step=step, workers=default_workers(), dither=dither_el)
+        save_labels(st.session_state.labels_key, labels)
+    st.session_state.gartic_labels = labels
+    st.session_state.prep_phases = trace.phases
 
 # Button to process uploaded image
 if st.button("⚙️ Process Image"):
     process_uploaded_image()
 
 # Display processed image preview
-if st.session_state.gartic_img is not None:
-    st.image(st.session_state.gartic_img, caption="✅ Image Converted to Gartic Colors", channels="BGR")
+if st.session_state.gartic_labels is not None:
+    st.image(render_labels(st.session_state.gartic_labels), caption="✅ Image Converted to Gartic Colors", channels="BGR")
 
 # Drawing mode selection: Pen vs Box
 is_box_el = st.checkbox("🧱 Use Box Tool", value=False,
@@ -128,19 +225,117 @@ is_box_el = st.checkbox("🧱 Use Box Tool", value=False,
                             "Draw using boxes instead of pen. More precise pixel placements, but a bit slower. (Better for replicating exact image.)"
                             "Drawing using pen instead of boxes. More blurry pattern, a bit faster. (Better for realistic or abstract.)"  
                             ),
-                        disabled=st.session_state.gartic_img is None)
+                        disabled=st.session_state.gartic_labels is None)
 
 # Speed control for drawing
 steps_el = st.slider("⏱️ Drawing Steps (Higher = More abstract)", min_value=1, max_value=20, value=2,
                      help="Drawing step size. Keep this at 2 for most images.",
-                     disabled=st.session_state.gartic_img is None)
+                     disabled=st.session_state.gartic_labels is None)
+
+# Box tool only: one drag per rectangle instead of one per row
+rectangles_el = st.checkbox("🔲 Merge Boxes into Rectangles", value=False,
+                            help="Box tool only. Draws areas of the same color as a single filled box. Far fewer strokes, select the FILLED box in Gartic.",
+                            disabled=st.session_state.gartic_labels is None or not is_box_el)
+
+# Drawing order: row by row vs one pass per color
+group_colors_el = st.checkbox("🗂️ Group Strokes by Color", value=False,
+                              help="Draws every color in one pass, so the palette is clicked at most once per color. Much faster for busy images.",
+                              disabled=st.session_state.gartic_labels is None)
+
+# Within each color, reorder strokes to cut cursor travel
+optimize_travel_el = st.checkbox("🧭 Optimize Cursor Travel", value=False,
+                                 help="Plans a short path through the strokes of each color. Takes a few seconds before drawing starts.",
+                                 disabled=st.session_state.gartic_labels is None)
+
+# Input pacing: how long to wait around every click and drag
+pacing_profiles = load_profiles("box" if is_box_el else "pen")
+pacing_col1, pacing_col2 = st.columns(2)
+pacing_el = pacing_col1.selectbox("⚡ Input Pacing", list(pacing_profiles.keys()),
+                                  help="Delays between mouse events. 'classic' is the safe default; faster profiles may drop strokes if the game lags. "
+                                       "Calibrate to find the fastest delays that still work on your machine.",
+                                  disabled=st.session_state.gartic_labels is None)
+
+# Draw test lines in the top-left corner of the canvas to find the smallest delays that register
+def calibrate_pacing_onclick():
+    winsound.Beep(800, 50)
+    time.sleep(2)
+    profile = calibrate_pacing(get_input_backend(), st.session_state.gartic_palette_xy, st.session_state.drawing_bbox, screenshot_region_numpy)
+    save_profile(profile)
+    winsound.Beep(800, 50)
+
+pacing_col2.button("🧪 Calibrate Pacing",
+                   help="Draws a few test lines in the top-left corner of the canvas to find the fastest delays. Keep Gartic Phone active and clear the canvas afterwards.",
+                   on_click=calibrate_pacing_onclick, type="tertiary",
+                   disabled=st.session_state.gartic_palette_xy is None)
+
+# Closed loop: check the canvas every few hundred strokes and redraw what didn't register
+verify_el = st.checkbox("🔍 Verify & Repair While Drawing", value=False,
+                        help="Captures the canvas as it draws, redraws strokes the game dropped and slows down or speeds up "
+                             "to match how fast the game keeps up. Lets the faster pacing profiles be used safely.",
+                        disabled=st.session_state.gartic_labels is None)
+
+# Re-convert the image so it can be drawn within a time budget with the options above
+budget_col1, budget_col2 = st.columns(2)
+budget_el = budget_col1.number_input("⏳ Drawing Time Budget (seconds)", min_value=5, max_value=3600, value=120, step=5,
+                                     help="Target drawing time with the selected tool, steps, grouping and pacing.",
+                                     disabled=st.session_state.source_img is None)
+
+def fit_to_budget_onclick():
+    tool = "box" if is_box_el else "pen"
+    labels, report = fit_labels_to_budget(st.session_state.source_img, 11 - details_el, budget_el,
+                                          tool, steps_el, pacing_profiles[pacing_el],
+                                          rectangles=rectangles_el, group_colors=group_colors_el)
+    st.session_state.gartic_labels = labels
+    st.session_state.labels_key = cache_key(st.session_state.image_key, "budget", 11 - details_el, budget_el, tool, steps_el,
+                                            pacing_profiles[pacing_el], rectangles_el, group_colors_el)
+    st.session_state.budget_report = report
+
+budget_col2.button("🎯 Fit to Time Budget",
+                   help="Merges similar neighbouring colors into longer strokes until the drawing fits the budget, "
+                        "keeping as much detail as the time allows. Press 'Process Image' to undo.",
+                   on_click=fit_to_budget_onclick, type="tertiary",
+                   disabled=st.session_state.source_img is None)
+
+if st.session_state.budget_report:
+    st.json(st.session_state.budget_report, expanded=False)
+
+# Live progress and ETA of a drawing, shown at the top of the page while the button's callback runs
+def start_trace(mode: str) -> DrawTrace:
+    progress_bar = st.progress(0.0, text="✏️ Drawing...")
+
+    def show_progress(trace: DrawTrace):
+        eta = trace.eta
+        progress_bar.progress(trace.fraction, text=f"✏️ {trace.position} of {trace.total} strokes drawn"
+                                                   + (f", about {eta:.0f}s left" if eta is not None else ""))
+
+    settings = {"mode": mode, "tool": "box" if is_box_el else "pen", "step": steps_el, "details": details_el,
+                "dither": dither_el, "pacing": pacing_el, "group_colors": group_colors_el, "rectangles": rectangles_el,
+                "optimize_travel": optimize_travel_el, "verify": verify_el,
+                "width": st.session_state.drawing_bbox["width"], "height": st.session_state.drawing_bbox["height"]}
+    trace = DrawTrace(settings, on_progress=show_progress)
+    trace.phases.update(st.session_state.prep_phases)
+    return trace
+
+# Keep the trace for the export buttons, and in temp/traces to compare runs
+def finish_trace(trace: DrawTrace):
+    save_trace(trace)
+    st.session_state.draw_trace = trace
 
 # Start drawing
 def draw_function():
+    trace = start_trace("draw")
     if is_box_el.numerator == 1:
-        draw_img_with_box(st.session_state.gartic_img, st.session_state.gartic_palette_xy, st.session_state.drawing_bbox, step=steps_el.numerator)
+        report = draw_img_with_box(st.session_state.gartic_labels, st.session_state.gartic_palette_xy, st.session_state.drawing_bbox,
+                                   step=steps_el.numerator, group_colors=group_colors_el, rectangles=rectangles_el,
+                                   optimize_travel=optimize_travel_el, pacing=pacing_profiles[pacing_el],
+                                   labels_key=st.session_state.labels_key, verify=verify_el, trace=trace)
     elif is_box_el.numerator == 0:
-        draw_img_with_pen(st.session_state.gartic_img, st.session_state.gartic_palette_xy, st.session_state.drawing_bbox, step=steps_el.numerator)
+        report = draw_img_with_pen(st.session_state.gartic_labels, st.session_state.gartic_palette_xy, st.session_state.drawing_bbox,
+                                   step=steps_el.numerator, group_colors=group_colors_el, optimize_travel=optimize_travel_el,
+                                   pacing=pacing_profiles[pacing_el], labels_key=st.session_state.labels_key,
+                                   verify=verify_el, trace=trace)
+    st.session_state.order_report = report
+    finish_trace(trace)
 
 # Draw button
 btn1col, btn2col = st.columns(2)
@@ -149,4 +344,76 @@ btn1col.button("✏️ Start Drawing!",
                     "⚠️ Press 'Q' anytime to stop.\n"
                     "🖊️ Use the SECOND pen radius if using Pen Mode!",
                on_click=draw_function,
-               type="primary", disabled=st.session_state.gartic_img is None)
+               type="primary", disabled=st.session_state.gartic_labels is None)
+
+# Draw only what differs from what is on the canvas now
+def diff_draw_function():
+    trace = start_trace("diff")
+    st.session_state.order_report = draw_img_diff(
+        st.session_state.gartic_labels, st.session_state.gartic_palette_xy, st.session_state.drawing_bbox,
+        "box" if is_box_el else "pen", steps_el, group_colors=group_colors_el, rectangles=rectangles_el,
+        optimize_travel=optimize_travel_el, pacing=pacing_profiles[pacing_el], trace=trace)
+    finish_trace(trace)
+
+st.button("🔁 Draw Differences Only",
+          help="Captures the canvas and only draws the parts that don't match the image yet, "
+               "e.g. to finish a partly drawn image or to redraw after changing it.\n"
+               "⚠️ Press 'Q' anytime to stop.",
+          on_click=diff_draw_function, disabled=st.session_state.gartic_labels is None)
+
+# Continue an interrupted drawing (stopped with 'q', lost focus, app restarted)
+session = DrawingSession.read_state()  # Just the checkpoint: the program is only loaded to resume
+can_resume = session is not None and not session["done"] and st.session_state.gartic_palette_xy is not None
+if session is not None and not session["done"]:
+    st.caption(f"⏸️ Last drawing stopped at stroke {session['position']} of {session['total']}.")
+
+def resume_function(only_missing: bool):
+    trace = start_trace("missing" if only_missing else "resume")
+    resume_drawing(st.session_state.gartic_palette_xy, st.session_state.drawing_bbox,
+                   pacing=pacing_profiles[pacing_el], only_missing=only_missing, trace=trace)
+    finish_trace(trace)
+
+resume_col1, resume_col2 = st.columns(2)
+resume_col1.button("↩️ Resume from Last Stroke",
+                   help="Continues the last drawing where it stopped. Don't clear the canvas.\n"
+                        "⚠️ Press 'Q' anytime to stop.",
+                   on_click=resume_function, args=(False,), disabled=not can_resume)
+resume_col2.button("🩹 Redraw Missing Strokes",
+                   help="Captures the canvas and redraws only the strokes of the last drawing that don't show on it.\n"
+                        "⚠️ Press 'Q' anytime to stop.",
+                   on_click=resume_function, args=(True,),
+                   disabled=session is None or st.session_state.gartic_palette_xy is None)
+
+# Show what the drawing-order options saved on the last run
+if st.session_state.order_report:
+    st.json(st.session_state.order_report, expanded=False)
+
+# Convert and draw at the same time, without waiting for "Process Image"
+def stream_draw_function():
+    trace = start_trace("stream")
+    trace.phases.clear()  # Decoding and resizing are timed here, the rest overlaps with drawing
+    with trace.phase("decode"):
+        img = to_opencv_img(uploaded_img_el.getbuffer())
+    with trace.phase("resize"):
+        img = resize_img(img, st.session_state.drawing_bbox["width"], st.session_state.drawing_bbox["height"])
+    draw_img_streaming(img, 11 - details_el, st.session_state.gartic_palette_xy, st.session_state.drawing_bbox,
+                       "box" if is_box_el else "pen", steps_el, group_colors=group_colors_el, rectangles=rectangles_el,
+                       optimize_travel=optimize_travel_el, pacing=pacing_profiles[pacing_el], trace=trace)
+    finish_trace(trace)
+
+btn2col.button("⚡ Convert & Draw",
+               help="Starts drawing right away and converts the rest of the image while drawing.\n"
+                    "Grouping and travel options apply per band of rows.\n"
+                    "⚠️ Press 'Q' anytime to stop.",
+               on_click=stream_draw_function,
+               disabled=uploaded_img_el is None or st.session_state.gartic_palette_xy is None)
+
+# Where the time of the last drawing went, exportable to compare modes and steps
+if st.session_state.draw_trace is not None:
+    trace = st.session_state.draw_trace
+    st.json(trace.summary(), expanded=False)
+    trace_col1, trace_col2 = st.columns(2)
+    trace_col1.download_button("📄 Export Trace (JSON)", trace.to_json(), file_name="gartic_trace.json", mime="application/json",
+                               help="Phase times, counters, reports and progress over time of the last drawing.")
+    trace_col2.download_button("📊 Export Trace (CSV)", trace.to_csv(), file_name="gartic_trace.csv", mime="text/csv",
+                               help="One summary row. Every drawing is also appended to temp/traces/runs.csv.")
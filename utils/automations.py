@@ -1,12 +1,22 @@
-from pynput import mouse, keyboard
-import mss
 import numpy as np
-from utils.color import gartic_colors_bgr, gartic_bgr_colornames
-import pyautogui
+from utils.color import gartic_color_names, screen_gartic_labels
+from utils.strokes import StrokeProgram, DRAG_DELAY
+from utils.ordering import arrange_strokes
+from utils.backends import InputBackend, get_input_backend
+from utils.executor import run_stroke_program
+from utils.pacing import PacingProfile
+from utils.pipeline import plan_bands, plan_drawing, stream_draw
+from utils.session import DrawingSession, missing_strokes
+from utils.verify import run_verified_program
+from utils.telemetry import DrawTrace
+from utils.diff import plan_diff_strokes
+from utils.detect import get_layout
+from utils.capture import get_capture_service
+import threading
 import time
-import cv2 as cv
-import winsound
-import win32api, win32con
+
+# pynput and pyautogui load their platform backends when imported, so they are imported
+# by the functions that listen or click instead of on every app start
 
 
 def get_border_clicks():
@@ -16,6 +26,8 @@ def get_border_clicks():
     Returns:
         List[Tuple[int, int]]: Two (x, y) coordinates of the clicked screen points.
     """
+    from pynput import mouse
+
     clicks = []
     max_clicks = 2
 
@@ -63,14 +75,32 @@ def screenshot_region_numpy(left, top, width, height):
         height (int): Height of capture box.
 
     Returns:
-        numpy.ndarray: Screenshot image in BGR format.
+        numpy.ndarray: Screenshot image in BGR format (a view into the capture, see utils.capture).
+    """
+    return get_capture_service().grab(left, top, width, height)
+
+
+def screenshot_screen_numpy() -> tuple:
+    """
+    Captures all monitors at once.
+
+    Returns:
+        tuple: (image, origin) where image is the raw BGRA capture and origin the screen
+        position of its top-left pixel.
     """
-    with mss.mss() as sct:
-        monitor = {"left": left, "top": top, "width": width, "height": height}
-        sct_img = sct.grab(monitor)
-        img_np = np.array(sct_img)  # Convert raw BGRA to NumPy
-        img_bgr = img_np[:, :, :3]  # Remove alpha channel
-        return img_bgr
+    return get_capture_service().grab_screen()
+
+
+def detect_gartic_layout() -> dict | None:
+    """
+    Finds the drawing canvas and the palette in one screenshot (see utils.detect).
+    The Gartic Phone window must be visible with a blank canvas.
+
+    Returns:
+        dict: drawing_bbox, colors_bbox and palette_xys, or None if not found.
+    """
+    screen, origin = screenshot_screen_numpy()
+    return get_layout(screen, origin)
 
 
 def get_gartic_colors_palette(colors_bbox: dict) -> dict:
@@ -85,7 +115,7 @@ def get_gartic_colors_palette(colors_bbox: dict) -> dict:
     """
     colors_bbox = colors_bbox.copy()
     width, height, left, right, top, bottom = list(colors_bbox.values())
-    color_names = list(gartic_colors_bgr.keys())
+    color_names = gartic_color_names
     color_xy = {}
 
     # Iterate grid: 3 columns x 6 rows
@@ -107,6 +137,8 @@ def test_color_palette(color_xy_points: dict):
     Args:
         color_xy_points (dict): Mapping of color names to screen coordinates.
     """
+    import pyautogui
+
     for color_name, xy in color_xy_points.items():
         pyautogui.moveTo(*xy)
         pyautogui.leftClick()
@@ -121,177 +153,354 @@ def mouse_drag(start, end):
         start (tuple): (x, y) starting position.
         end (tuple): (x, y) ending position.
     """
-    win32api.SetCursorPos(start)
-    win32api.mouse_event(win32con.MOUSEEVENTF_LEFTDOWN, 0, 0)
-    time.sleep(0.005)
-    win32api.SetCursorPos(end)
-    time.sleep(0.005)
-    win32api.mouse_event(win32con.MOUSEEVENTF_LEFTUP, 0, 0)
+    get_input_backend().drag(start, end, DRAG_DELAY, DRAG_DELAY)
 
 
-def draw_img_with_box(
-    gartic_img: cv.typing.MatLike,
-    palette_xys: dict,
-    drawing_bbox: dict,
-    step: int = 5
-):
+def _start_stop_listener() -> tuple:
     """
-    Simulates drawing the given image using rectangular brush strokes in a drawing area.
+    Start a keyboard listener that flags a stop when 'q' is pressed.
 
-    Args:
-        gartic_img (cv.Mat): Preprocessed image using Gartic color palette.
-        palette_xys (dict): Mapping of color name to screen position.
-        drawing_bbox (dict): Bounding box of drawing canvas on screen.
-        step (int): Vertical step between drawing lines (resolution/speed tradeoff).
+    Returns:
+        tuple: (listener, stop_event)
     """
-    drawing_area_left = drawing_bbox["left"]
-    drawing_area_top = drawing_bbox["top"]
-    stop_drawing = False
+    from pynput import keyboard
+
+    stop_event = threading.Event()
 
-    # Allow stopping drawing with 'q' key
     def on_press(key):
-        nonlocal stop_drawing
         try:
             if key.char == 'q':
                 print("Pressed 'q' — stopping drawing loop.")
-                stop_drawing = True
+                stop_event.set()
                 return False
         except AttributeError:
             pass
 
     listener = keyboard.Listener(on_press=on_press)
     listener.start()
+    return listener, stop_event
+
+
+def execute_stroke_program(
+    program: StrokeProgram,
+    palette_xys: dict,
+    drawing_bbox: dict,
+    backend: InputBackend | None = None,
+    pacing: PacingProfile | None = None,
+    session: DrawingSession | None = None,
+    verify: bool = False,
+    trace: DrawTrace | None = None
+):
+    """
+    Draws a compiled stroke program on the drawing area. Press 'q' to stop.
 
-    winsound.Beep(800, 50)  # Starting beep
+    Args:
+        program (StrokeProgram): Program from utils.strokes.plan_strokes (or StrokeProgram.load).
+        palette_xys (dict): Mapping of color name to screen position.
+        drawing_bbox (dict): Bounding box of drawing canvas on screen.
+        backend (InputBackend): Where the input goes. Defaults to the real mouse (Win32Backend).
+        pacing (PacingProfile): Delays around each event. Defaults to the classic delays of the tool.
+        session (DrawingSession): Session of `program`: drawing starts at its position and
+            progress is checkpointed into it, so an interrupted run can be resumed.
+        verify (bool): Check the canvas while drawing, redraw dropped strokes and adapt the
+            delays to the drop rate (see utils.verify.run_verified_program).
+        trace (DrawTrace): Collects the draw time, what was sent and the progress (see utils.telemetry).
+    """
+    backend = backend or get_input_backend()
+    listener, stop_event = _start_stop_listener()
+
+    backend.beep(800, 50)  # Starting beep
     time.sleep(2)  # Delay to let user switch to Gartic
 
-    height, width, _ = gartic_img.shape
-    last_color_name = None
-    box_expand = 3  # Slightly widen horizontal drawing
-
-    y = 0
-    while y < height:
-        if stop_drawing:
-            break
-
-        x = 0
-        while x < width:
-            if stop_drawing:
-                break
-
-            bgr = tuple(gartic_img[y, x])
-            color_name = gartic_bgr_colornames.get(bgr)
-
-            # Skip unknown or white (background) pixels
-            if color_name is None or color_name == "white":
-                x += 1
-                continue
-
-            # Change pen color if necessary
-            if last_color_name != color_name:
-                pos = palette_xys[color_name]
-                win32api.SetCursorPos((int(pos[0]), int(pos[1])))
-                win32api.mouse_event(win32con.MOUSEEVENTF_LEFTDOWN, 0, 0)
-                win32api.mouse_event(win32con.MOUSEEVENTF_LEFTUP, 0, 0)
-                time.sleep(0.003)
-                last_color_name = color_name
-
-            # Scan horizontal run of same color
-            run_start = x
-            while x < width and tuple(gartic_img[y, x]) == bgr:
-                x += 1
-            run_end = x - 1
-
-            # Draw rectangle line over vertical span
-            for dy in range(step):
-                yy = y + dy
-                if yy >= height:
-                    break
-                box_start = (drawing_area_left + run_start, drawing_area_top + yy)
-                box_end = (
-                    drawing_area_left + min(run_end + box_expand, width - 1),
-                    drawing_area_top + min(yy + box_expand, height - 1)
-                )
-                mouse_drag(box_start, box_end)
-
-        y += step
+    _run_program(program, backend, palette_xys, drawing_bbox, stop_event, pacing, session, verify, trace)
 
     listener.stop()
-    winsound.Beep(800, 100)  # Ending beep
+    backend.beep(800, 100)  # Ending beep
 
 
-def draw_img_with_pen(
-    gartic_img: cv.typing.MatLike,
+def _run_program(program, backend, palette_xys, drawing_bbox, stop_event, pacing, session, verify=False, trace=None):
+    """
+    Run a program, from and into its session if there is one, verified against canvas
+    captures if asked, into a trace if there is one.
+    """
+    start = session.position if session is not None else 0
+    trace = trace or DrawTrace()
+    trace.start_program(len(program.ops), start)
+
+    def progress(position):
+        if session is not None:
+            session.checkpoint(position)
+        trace.update_progress(position)
+
+    with trace.phase("draw"):
+        if verify:
+            report = run_verified_program(program, backend, palette_xys, drawing_bbox, get_capture_service().grab_bbox,
+                                          stop_event, pacing, start=start, progress=progress, trace=trace)
+            position = report["position"]
+            trace.reports["verify"] = report
+            print(f"Verification: {report['missed']} of {report['strokes_checked']} strokes dropped, "
+                  f"{report['redrawn']} redrawn, {report['still_missing']} still missing, "
+                  f"delays x{report['pacing_factor']}")
+        else:
+            position = run_stroke_program(program, backend, palette_xys, drawing_bbox, stop_event, pacing,
+                                          start=start, progress=progress, trace=trace)
+    print(f"Drew {trace.counters['drags']} strokes with {trace.counters['color_changes']} color changes in "
+          f"{trace.phases['draw']:.1f}s ({trace.counters['sleep_seconds']:.1f}s sleeping)")
+    if session is None:
+        return
+    session.checkpoint(position, force=True)
+    if not session.done:
+        print(f"Stopped at op {position} of {len(program.ops)}, resume to finish")
+
+
+def resume_drawing(
     palette_xys: dict,
     drawing_bbox: dict,
-    step: int
+    pacing: PacingProfile | None = None,
+    only_missing: bool = False,
+    trace: DrawTrace | None = None
 ):
     """
-    Simulates drawing the given image using single-pixel-width pen strokes.
+    Continue the last drawing session where it stopped. Press 'q' to stop again.
 
     Args:
-        gartic_img (cv.Mat): Image using limited Gartic color palette.
-        palette_xys (dict): Color name to screen (x, y) palette positions.
-        drawing_bbox (dict): Bounding box of drawing canvas.
-        step (int): Resolution (vertical spacing) of drawing scan.
+        palette_xys (dict): Mapping of color name to screen position.
+        drawing_bbox (dict): Bounding box of drawing canvas on screen.
+        pacing (PacingProfile): Delays around each event. Defaults to the classic delays of the tool.
+        only_missing (bool): Instead of continuing from the checkpoint, capture the canvas
+            and redraw only the strokes it does not show (see utils.session.missing_strokes).
+        trace (DrawTrace): Collects the draw time, what was sent and the progress (see utils.telemetry).
     """
-    print(f"Step size: {step}")
-    drawing_area_left = drawing_bbox["left"]
-    drawing_area_top = drawing_bbox["top"]
-    stop_drawing = False
+    session = DrawingSession.load()
+    if session is None:
+        print("No drawing session to resume")
+        return
 
-    def on_press(key):
-        nonlocal stop_drawing
-        try:
-            if key.char == 'q':
-                print("Pressed 'q' — stopping drawing loop.")
-                stop_drawing = True
-                return False
-        except AttributeError:
-            pass
+    backend = get_input_backend()
+    listener, stop_event = _start_stop_listener()
 
-    listener = keyboard.Listener(on_press=on_press)
-    listener.start()
+    backend.beep(800, 50)  # Starting beep
+    time.sleep(2)  # Delay to let user switch to Gartic
 
-    winsound.Beep(800, 50)
-    time.sleep(2)
+    if only_missing:
+        canvas = screenshot_region_numpy(drawing_bbox["left"], drawing_bbox["top"], drawing_bbox["width"], drawing_bbox["height"])
+        missing = missing_strokes(session.program, screen_gartic_labels(canvas))
+        print(f"Redrawing {missing.drag_count} of {session.program.drag_count} strokes")
+        session = DrawingSession.start(missing)
 
-    height, width, _ = gartic_img.shape
-    last_color_name = None
+    _run_program(session.program, backend, palette_xys, drawing_bbox, stop_event, pacing, session, trace=trace)
 
-    for y in range(0, height, step):
-        if stop_drawing:
-            break
+    listener.stop()
+    backend.beep(800, 100)  # Ending beep
 
-        x = 0
-        while x < width:
-            if stop_drawing:
-                break
 
-            bgr = tuple(gartic_img[y, x])
-            color_name = gartic_bgr_colornames.get(bgr)
+def draw_img_diff(
+    labels: np.ndarray,
+    palette_xys: dict,
+    drawing_bbox: dict,
+    tool: str,
+    step: int,
+    group_colors: bool = False,
+    rectangles: bool = False,
+    optimize_travel: bool = False,
+    pacing: PacingProfile | None = None,
+    trace: DrawTrace | None = None
+):
+    """
+    Captures the canvas and draws only what differs from the image, e.g. to finish a
+    partial drawing or to update one after a small edit. Press 'q' to stop.
 
-            if color_name is None:
-                x += step
-                continue
+    Args:
+        labels (np.ndarray): Palette index map of the image (see utils.color.to_gartic_labels).
+        palette_xys (dict): Mapping of color name to screen position.
+        drawing_bbox (dict): Bounding box of drawing canvas on screen.
+        tool (str): "box" or "pen".
+        step (int): Drawing step.
+        group_colors (bool): Draw each color in one pass instead of row by row.
+        rectangles (bool): Merge box rows into rectangles (box tool only).
+        optimize_travel (bool): Reorder strokes within each color to cut cursor travel.
+        pacing (PacingProfile): Delays around each event. Defaults to the classic delays.
+        trace (DrawTrace): Collects the plan and draw times, what was sent and the progress.
+
+    Returns:
+        dict: Strokes of the difference vs. a full drawing, plus what the ordering passes saved.
+    """
+    backend = get_input_backend()
+    listener, stop_event = _start_stop_listener()
+
+    backend.beep(800, 50)  # Starting beep
+    time.sleep(2)  # Delay to let user switch to Gartic
+
+    trace = trace or DrawTrace()
+    with trace.phase("plan"):
+        canvas = screenshot_region_numpy(drawing_bbox["left"], drawing_bbox["top"], drawing_bbox["width"], drawing_bbox["height"])
+        program = plan_diff_strokes(labels, screen_gartic_labels(canvas), tool, step, rectangles)
+        program, report = arrange_strokes(program, group_colors=group_colors, optimize=optimize_travel)
+    report["diff_strokes"] = program.drag_count
+    trace.reports["order"] = report
+    print(f"Drawing {program.drag_count} strokes that differ from the canvas")
+
+    _run_program(program, backend, palette_xys, drawing_bbox, stop_event, pacing, DrawingSession.start(program), trace=trace)
+
+    listener.stop()
+    backend.beep(800, 100)  # Ending beep
+    return report
+
+
+def _draw_program(
+    labels: np.ndarray,
+    tool: str,
+    step: int,
+    rectangles: bool,
+    palette_xys: dict,
+    drawing_bbox: dict,
+    group_colors: bool,
+    optimize_travel: bool,
+    pacing: PacingProfile | None,
+    labels_key: str | None = None,
+    verify: bool = False,
+    trace: DrawTrace | None = None
+):
+    """
+    Plan a drawing (or load the plan from the cache, see utils.pipeline.plan_drawing),
+    then draw it.
 
-            # Change pen color
-            if last_color_name != color_name:
-                win32api.SetCursorPos((int(palette_xys[color_name][0]), int(palette_xys[color_name][1])))
-                win32api.mouse_event(win32con.MOUSEEVENTF_LEFTDOWN, 0, 0)
-                win32api.mouse_event(win32con.MOUSEEVENTF_LEFTUP, 0, 0)
-                last_color_name = color_name
-                time.sleep(0.005)
+    Args:
+        labels_key (str): Cache key of `labels` (see utils.cache). None = no caching.
+        verify (bool): Verify and repair while drawing (see execute_stroke_program).
+        trace (DrawTrace): Collects the plan and draw times, what was sent and the progress.
+    """
+    trace = trace or DrawTrace()
+    with trace.phase("plan"):
+        program, report, cached = plan_drawing(labels, tool, step, rectangles, group_colors, optimize_travel, labels_key)
+    if cached:
+        print("Stroke plan loaded from cache")
+    trace.reports["order"] = report
+    if "switches_saved" in report:
+        print(f"Color grouping: {report['color_changes_before']} -> {report['color_changes_after']} palette switches, "
+              f"{report['sleep_saved']:.2f}s less sleeping")
+    if "travel_before" in report:
+        print(f"Travel optimization: {report['travel_before']:.0f} -> {report['travel_after']:.0f} px cursor travel, "
+              f"{report['long_moves_before']} -> {report['long_moves_after']} long moves")
+
+    execute_stroke_program(program, palette_xys, drawing_bbox, pacing=pacing, session=DrawingSession.start(program),
+                           verify=verify, trace=trace)
+    return report
+
+
+def draw_img_with_box(
+    labels: np.ndarray,
+    palette_xys: dict,
+    drawing_bbox: dict,
+    step: int = 5,
+    group_colors: bool = False,
+    rectangles: bool = False,
+    optimize_travel: bool = False,
+    pacing: PacingProfile | None = None,
+    labels_key: str | None = None,
+    verify: bool = False,
+    trace: DrawTrace | None = None
+):
+    """
+    Simulates drawing the given image using rectangular brush strokes in a drawing area.
+
+    Args:
+        labels (np.ndarray): Palette index map of the image (see utils.color.to_gartic_labels).
+        palette_xys (dict): Mapping of color name to screen position.
+        drawing_bbox (dict): Bounding box of drawing canvas on screen.
+        step (int): Vertical step between drawing lines (resolution/speed tradeoff).
+        group_colors (bool): Draw each color in one pass instead of row by row.
+        rectangles (bool): Merge identical runs on neighbouring rows into one box (needs the filled box tool).
+        optimize_travel (bool): Reorder strokes within each color to cut cursor travel.
+        pacing (PacingProfile): Delays around each event (see utils.pacing). Defaults to the classic delays.
+        labels_key (str): Cache key of `labels` (see utils.cache). When given, the stroke plan is cached too.
+        verify (bool): Check the canvas while drawing and redraw dropped strokes (see utils.verify).
+        trace (DrawTrace): Collects the plan and draw times, what was sent and the progress (see utils.telemetry).
 
-            # Draw single-line stroke across same-color pixels
-            run_start = x
-            while x < width and tuple(gartic_img[y, x]) == bgr:
-                x += step
-            run_end = x - step
+    Returns:
+        dict: What the ordering passes saved (see utils.ordering.arrange_strokes).
+    """
+    return _draw_program(labels, "box", step, rectangles, palette_xys, drawing_bbox,
+                         group_colors, optimize_travel, pacing, labels_key, verify, trace)
+
+
+def draw_img_with_pen(
+    labels: np.ndarray,
+    palette_xys: dict,
+    drawing_bbox: dict,
+    step: int,
+    group_colors: bool = False,
+    optimize_travel: bool = False,
+    pacing: PacingProfile | None = None,
+    labels_key: str | None = None,
+    verify: bool = False,
+    trace: DrawTrace | None = None
+):
+    """
+    Simulates drawing the given image using single-pixel-width pen strokes.
+
+    Args:
+        labels (np.ndarray): Palette index map of the image (see utils.color.to_gartic_labels).
+        palette_xys (dict): Color name to screen (x, y) palette positions.
+        drawing_bbox (dict): Bounding box of drawing canvas.
+        step (int): Resolution (vertical spacing) of drawing scan.
+        group_colors (bool): Draw each color in one pass instead of row by row.
+        optimize_travel (bool): Reorder strokes within each color to cut cursor travel.
+        pacing (PacingProfile): Delays around each event (see utils.pacing). Defaults to the classic delays.
+        labels_key (str): Cache key of `labels` (see utils.cache). When given, the stroke plan is cached too.
+        verify (bool): Check the canvas while drawing and redraw dropped strokes (see utils.verify).
+        trace (DrawTrace): Collects the plan and draw times, what was sent and the progress (see utils.telemetry).
+
+    Returns:
+        dict: What the ordering passes saved (see utils.ordering.arrange_strokes).
+    """
+    print(f"Step size: {step}")
+    return _draw_program(labels, "pen", step, False, palette_xys, drawing_bbox,
+                         group_colors, optimize_travel, pacing, labels_key, verify, trace)
+
+
+def draw_img_streaming(
+    img: np.ndarray,
+    quantize_step: int,
+    palette_xys: dict,
+    drawing_bbox: dict,
+    tool: str,
+    step: int,
+    group_colors: bool = False,
+    rectangles: bool = False,
+    optimize_travel: bool = False,
+    pacing: PacingProfile | None = None,
+    trace: DrawTrace | None = None
+):
+    """
+    Converts and draws an image at the same time: bands are quantized and planned in a
+    background thread while the finished ones are being drawn. Press 'q' to stop both.
+
+    Args:
+        img (np.ndarray): BGR image, already resized to the drawing area.
+        quantize_step (int): Block size of the palette conversion (see utils.color.to_gartic_labels).
+        palette_xys (dict): Mapping of color name to screen position.
+        drawing_bbox (dict): Bounding box of drawing canvas on screen.
+        tool (str): "box" or "pen".
+        step (int): Drawing step.
+        group_colors (bool): Draw each color of a band in one pass.
+        rectangles (bool): Merge box rows into rectangles (box tool only).
+        optimize_travel (bool): Reorder strokes within each color to cut cursor travel.
+        pacing (PacingProfile): Delays around each event. Defaults to the classic delays.
+        trace (DrawTrace): Collects what was sent and the progress, against a total
+            estimated from the bands planned so far. Converting and planning overlap with
+            drawing here, so all of it counts as the draw phase.
+    """
+    backend = get_input_backend()
+    listener, stop_event = _start_stop_listener()
+
+    backend.beep(800, 50)  # Starting beep
+    time.sleep(2)  # Delay to let user switch to Gartic
 
-            start_pos = (drawing_area_left + run_start, drawing_area_top + y)
-            end_pos = (drawing_area_left + run_end, drawing_area_top + y)
-            mouse_drag(start_pos, end_pos)
+    trace = trace or DrawTrace()
+    bands = plan_bands(img, quantize_step, tool, step, rectangles, group_colors, optimize_travel)
+    with trace.phase("draw"):
+        stream_draw(bands, backend, palette_xys, drawing_bbox, stop_event, pacing, trace=trace)
 
     listener.stop()
-    winsound.Beep(800, 100)
+    backend.beep(800, 100)  # Ending beep
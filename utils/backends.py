@@ -0,0 +1,306 @@
+import ctypes
+import threading
+from abc import ABC, abstractmethod
+import cv2 as cv
+import numpy as np
+from utils.color import gartic_color_names, WHITE_LABEL
+from utils.pacing import precise_sleep
+from utils.strokes import PEN_WIDTH
+
+# Primitive input events for InputBackend.send: (EV_MOVE, x, y), (EV_PRESS,), (EV_RELEASE,), (EV_SLEEP, seconds)
+EV_MOVE = 0
+EV_PRESS = 1
+EV_RELEASE = 2
+EV_SLEEP = 3
+
+SENDINPUT_CHUNK = 256  # Most events passed to one SendInput call
+
+# SendInput constants and structures (winuser.h)
+_INPUT_MOUSE = 0
+_MOUSEEVENTF_MOVE = 0x0001
+_MOUSEEVENTF_LEFTDOWN = 0x0002
+_MOUSEEVENTF_LEFTUP = 0x0004
+_MOUSEEVENTF_VIRTUALDESK = 0x4000
+_MOUSEEVENTF_ABSOLUTE = 0x8000
+_SM_XVIRTUALSCREEN, _SM_YVIRTUALSCREEN, _SM_CXVIRTUALSCREEN, _SM_CYVIRTUALSCREEN = 76, 77, 78, 79
+
+
+class _MOUSEINPUT(ctypes.Structure):
+    _fields_ = [
+        ("dx", ctypes.c_long),
+        ("dy", ctypes.c_long),
+        ("mouseData", ctypes.c_ulong),
+        ("dwFlags", ctypes.c_ulong),
+        ("time", ctypes.c_ulong),
+        ("dwExtraInfo", ctypes.c_size_t),
+    ]
+
+
+class _INPUT(ctypes.Structure):
+    # MOUSEINPUT is the largest member of the INPUT union, so it alone gives the right size
+    _fields_ = [("type", ctypes.c_ulong), ("mi", _MOUSEINPUT)]
+
+
+class InputBackend(ABC):
+    """
+    Where the drawing executor sends its input. Subclasses implement the primitive
+    events; click and drag are built from them.
+    """
+
+    @abstractmethod
+    def move(self, x: int, y: int):
+        ...
+
+    @abstractmethod
+    def press(self):
+        ...
+
+    @abstractmethod
+    def release(self):
+        ...
+
+    def sleep(self, seconds: float):
+        precise_sleep(seconds)
+
+    def beep(self, frequency: int, duration_ms: int):
+        pass
+
+    def click(self, pos: tuple):
+        """
+        Left click at a screen position.
+        """
+        self.move(int(pos[0]), int(pos[1]))
+        self.press()
+        self.release()
+
+    def send(self, events: list):
+        """
+        Send a batch of primitive events (see EV_MOVE etc.). Backends that can inject
+        several events in one call override this; the default sends them one by one.
+        """
+        for event in events:
+            kind = event[0]
+            if kind == EV_MOVE:
+                self.move(event[1], event[2])
+            elif kind == EV_PRESS:
+                self.press()
+            elif kind == EV_RELEASE:
+                self.release()
+            elif kind == EV_SLEEP:
+                self.sleep(event[1])
+
+    def drag(self, start: tuple, end: tuple, press_delay: float, move_delay: float):
+        """
+        Left-button drag from start to end, pausing `press_delay` seconds after pressing
+        and `move_delay` seconds after moving to the end.
+        """
+        self.move(*start)
+        self.press()
+        self.sleep(press_delay)
+        self.move(*end)
+        self.sleep(move_delay)
+        self.release()
+
+
+class Win32Backend(InputBackend):
+    """
+    Real mouse input through the Win32 API. Batches from send() are injected with
+    SendInput: every stretch of events between two (non-zero) sleeps becomes one call.
+    """
+
+    def __init__(self):
+        # Imported here: pywin32 only exists on Windows and only real input needs it
+        try:
+            import win32api, win32con, winsound
+        except ImportError:
+            raise RuntimeError("Win32Backend needs pywin32 (Windows only)")
+        self._win32api, self._win32con, self._winsound = win32api, win32con, winsound
+
+        # SendInput takes absolute positions as 0..65535 across the whole virtual desktop
+        self.screen_left = win32api.GetSystemMetrics(_SM_XVIRTUALSCREEN)
+        self.screen_top = win32api.GetSystemMetrics(_SM_YVIRTUALSCREEN)
+        self.screen_width = max(win32api.GetSystemMetrics(_SM_CXVIRTUALSCREEN) - 1, 1)
+        self.screen_height = max(win32api.GetSystemMetrics(_SM_CYVIRTUALSCREEN) - 1, 1)
+        self._send_input = ctypes.windll.user32.SendInput
+
+    def _flush(self, inputs: list):
+        if inputs:
+            array = (_INPUT * len(inputs))(*inputs)
+            self._send_input(len(inputs), array, ctypes.sizeof(_INPUT))
+            inputs.clear()
+
+    def send(self, events: list):
+        inputs = []
+        for event in events:
+            kind = event[0]
+            if kind == EV_SLEEP:
+                if event[1] > 0:
+                    self._flush(inputs)
+                    precise_sleep(event[1])
+                continue
+
+            if kind == EV_MOVE:
+                dx = round((event[1] - self.screen_left) * 65535 / self.screen_width)
+                dy = round((event[2] - self.screen_top) * 65535 / self.screen_height)
+                flags = _MOUSEEVENTF_MOVE | _MOUSEEVENTF_ABSOLUTE | _MOUSEEVENTF_VIRTUALDESK
+            else:
+                dx = dy = 0
+                flags = _MOUSEEVENTF_LEFTDOWN if kind == EV_PRESS else _MOUSEEVENTF_LEFTUP
+            inputs.append(_INPUT(_INPUT_MOUSE, _MOUSEINPUT(dx, dy, 0, flags, 0, 0)))
+
+            if len(inputs) >= SENDINPUT_CHUNK:
+                self._flush(inputs)
+        self._flush(inputs)
+
+    def move(self, x: int, y: int):
+        self._win32api.SetCursorPos((x, y))
+
+    def press(self):
+        self._win32api.mouse_event(self._win32con.MOUSEEVENTF_LEFTDOWN, 0, 0)
+
+    def release(self):
+        self._win32api.mouse_event(self._win32con.MOUSEEVENTF_LEFTUP, 0, 0)
+
+    def beep(self, frequency: int, duration_ms: int):
+        self._winsound.Beep(frequency, duration_ms)
+
+
+_input_backend = None
+_input_backend_lock = threading.Lock()
+
+
+def get_input_backend() -> Win32Backend:
+    """
+    The process-wide real-mouse backend, created on first use.
+    """
+    global _input_backend
+    if _input_backend is None:
+        with _input_backend_lock:  # The app's preload thread may be creating it right now
+            if _input_backend is None:
+                _input_backend = Win32Backend()
+    return _input_backend
+
+
+class SimulatedBackend(InputBackend):
+    """
+    In-memory stand-in for the game: palette clicks pick a color, drags inside the
+    drawing area are rasterized onto a label canvas, and sleeps advance a virtual clock
+    instead of blocking.
+
+    Attributes:
+        canvas (np.ndarray): uint8 palette index map of the drawing area, starts white.
+        clock (float): Simulated seconds spent (sleeps plus `event_cost` per event).
+        events (int): Primitive input events issued (moves, presses, releases).
+        drags (int): Completed drags inside the drawing area.
+        dropped (int): Drags and palette clicks lost because they came too fast.
+        palette_switches (int): Palette clicks that changed the color.
+    """
+
+    def __init__(
+        self,
+        drawing_bbox: dict,
+        palette_xys: dict,
+        tool: str,
+        pen_width: int = PEN_WIDTH,
+        event_cost: float = 0.0,
+        min_hold: float = 0.0,
+        min_color_settle: float = 0.0
+    ):
+        """
+        Args:
+            drawing_bbox (dict): Bounding box of the simulated drawing area on screen.
+            palette_xys (dict): Mapping of color name to screen position.
+            tool (str): "box" fills the dragged rectangle, "pen" draws a line.
+            pen_width (int): Line thickness of the pen tool in pixels.
+            event_cost (float): Seconds added to the clock per primitive event.
+            min_hold (float): Shortest press-to-release time of a drag that still draws.
+            min_color_settle (float): Shortest pause after a palette click that still registers it.
+        """
+        self.left = drawing_bbox["left"]
+        self.top = drawing_bbox["top"]
+        self.canvas = np.full((drawing_bbox["height"], drawing_bbox["width"]), WHITE_LABEL, dtype=np.uint8)
+        self.palette = {
+            (int(x), int(y)): gartic_color_names.index(name)
+            for name, (x, y) in palette_xys.items()
+        }
+        self.tool = tool
+        self.pen_width = pen_width
+        self.event_cost = event_cost
+        self.min_hold = min_hold
+        self.min_color_settle = min_color_settle
+
+        self.clock = 0.0
+        self.events = 0
+        self.drags = 0
+        self.dropped = 0
+        self.palette_switches = 0
+        self.color = 0  # Gartic starts with black selected
+        self.pending_color = None  # Palette click waiting to settle: (label, clock)
+        self.pos = (0, 0)
+        self.pressed_at = None
+        self.pressed_clock = 0.0
+
+    def _event(self):
+        self.events += 1
+        self.clock += self.event_cost
+
+    def move(self, x: int, y: int):
+        self._event()
+        self.pos = (x, y)
+
+    def _settle_color(self):
+        """
+        Apply the last palette click, unless the next press came too soon after it.
+        """
+        if self.pending_color is None:
+            return
+        label, clicked_at = self.pending_color
+        self.pending_color = None
+        if self.clock - clicked_at < self.min_color_settle:
+            self.dropped += 1
+            return
+        if label != self.color:
+            self.palette_switches += 1
+        self.color = label
+
+    def press(self):
+        self._event()
+        self._settle_color()
+        self.pressed_at = self.pos
+        self.pressed_clock = self.clock
+
+    def release(self):
+        self._event()
+        start, self.pressed_at = self.pressed_at, None
+        if start is None:
+            return
+
+        label = self.palette.get(start)
+        if label is not None and start == self.pos:
+            self.pending_color = (label, self.clock)
+            return
+
+        x0, y0 = start[0] - self.left, start[1] - self.top
+        x1, y1 = self.pos[0] - self.left, self.pos[1] - self.top
+        height, width = self.canvas.shape
+        if not (0 <= x0 < width and 0 <= y0 < height):
+            return
+
+        if self.clock - self.pressed_clock < self.min_hold:
+            self.dropped += 1
+            return
+
+        self.drags += 1
+        if self.tool == "box":
+            cv.rectangle(self.canvas, (x0, y0), (x1, y1), int(self.color), -1)
+        else:
+            cv.line(self.canvas, (x0, y0), (x1, y1), int(self.color), self.pen_width)
+
+    def sleep(self, seconds: float):
+        self.clock += seconds
+
+    def accuracy(self, target: np.ndarray) -> float:
+        """
+        Fraction of canvas pixels that match the target palette index map.
+        """
+        return float(np.mean(self.canvas == target))
@@ -0,0 +1,144 @@
+import numpy as np
+from utils.color import bgr_to_lab, gartic_lab_distances, QUANTIZE_TILE_PIXELS
+from utils.strokes import box_expand, plan_strokes
+from utils.ordering import arrange_strokes
+from utils.pacing import PacingProfile, estimate_draw_time
+
+BUDGET_START_PENALTY = 4.0  # First run-break penalty tried when the plain quantization is too slow
+BUDGET_MAX_PENALTY = 1e4  # Beyond this every row is a single color anyway
+BUDGET_ITERATIONS = 10  # Bisection steps between a too-slow and a fitting penalty
+
+
+def gartic_label_costs(img: np.ndarray, tile_pixels: int = QUANTIZE_TILE_PIXELS) -> np.ndarray:
+    """
+    CIEDE2000 distance of every pixel of a BGR image to every palette color.
+
+    Args:
+        img (np.ndarray): Input image in BGR format.
+        tile_pixels (int): Pixels converted per batch, to bound temporary memory.
+
+    Returns:
+        np.ndarray: float32 array of shape (h, w, 18).
+    """
+    h, w = img.shape[:2]
+    costs = np.empty((h, w, 18), dtype=np.float32)
+    rows_per_tile = max(1, tile_pixels // max(w, 1))
+    for y in range(0, h, rows_per_tile):
+        costs[y:y+rows_per_tile] = gartic_lab_distances(bgr_to_lab(img[y:y+rows_per_tile, :, :3]))
+    return costs
+
+
+def smooth_runs(costs: np.ndarray, penalty: float) -> np.ndarray:
+    """
+    Pick a palette color per pixel, minimizing per row the total color error plus
+    `penalty` for every color change along the row (each change starts a new stroke).
+
+    Exact per-row dynamic program (Viterbi over the 18 colors), run for all rows at
+    once: one vectorized step per column. penalty=0 gives the plain closest colors.
+
+    Args:
+        costs (np.ndarray): Distances of shape (h, w, 18), e.g. from gartic_label_costs.
+        penalty (float): Cost of a run break, in CIEDE2000 units.
+
+    Returns:
+        np.ndarray: uint8 palette index map of shape (h, w).
+    """
+    h, w, n = costs.shape
+    rows = np.arange(h)
+    total = costs[:, 0].astype(np.float64)
+    switched = np.zeros((h, w, n), dtype=bool)  # Best path into (x, color) came from another color
+    best_prev = np.zeros((h, w), dtype=np.uint8)  # Cheapest color at x - 1
+
+    for x in range(1, w):
+        best = np.argmin(total, axis=1)
+        best_cost = total[rows, best] + penalty
+        switch = best_cost[:, np.newaxis] < total
+        total = np.where(switch, best_cost[:, np.newaxis], total) + costs[:, x]
+        switched[:, x] = switch
+        best_prev[:, x] = best
+
+    labels = np.empty((h, w), dtype=np.uint8)
+    current = np.argmin(total, axis=1)
+    labels[:, -1] = current
+    for x in range(w - 1, 0, -1):
+        current = np.where(switched[rows, x, current], best_prev[:, x], current)
+        labels[:, x - 1] = current
+    return labels
+
+
+def fit_labels_to_budget(
+    img: np.ndarray,
+    step: int,
+    seconds: float,
+    tool: str,
+    draw_step: int,
+    pacing: PacingProfile,
+    rectangles: bool = False,
+    group_colors: bool = False,
+    event_cost: float = 0.0,
+    iterations: int = BUDGET_ITERATIONS
+) -> tuple:
+    """
+    The best-looking palette index map that can be drawn within `seconds`.
+
+    Colors are picked with smooth_runs; the run-break penalty is raised until the
+    planned program, timed with estimate_draw_time, fits the budget, then bisected
+    down to the smallest penalty that still fits.
+
+    Args:
+        img (np.ndarray): BGR image, already resized to the drawing area.
+        step (int): Block size, as in to_gartic_labels.
+        seconds (float): Drawing time budget.
+        tool (str): "box" or "pen".
+        draw_step (int): Drawing step for the planner.
+        pacing (PacingProfile): Delays the drawing will use.
+        rectangles (bool): Box tool only: the drawing merges rows into rectangles.
+        group_colors (bool): The drawing groups strokes by color.
+        event_cost (float): Seconds per input event on top of the delays.
+        iterations (int): Bisection steps.
+
+    Returns:
+        tuple: (labels, report) where labels is the uint8 index map of the image size
+        and report holds the chosen penalty, estimated seconds and whether it fits.
+    """
+    h, w = img.shape[:2]
+    costs = gartic_label_costs(img[::step, ::step])
+    expand = box_expand(rectangles, group_colors)
+
+    def attempt(penalty: float) -> tuple:
+        labels = smooth_runs(costs, penalty)
+        labels = np.repeat(np.repeat(labels, step, axis=0), step, axis=1)
+        labels = np.ascontiguousarray(labels[:h, :w])
+        program, _ = arrange_strokes(plan_strokes(labels, tool, draw_step, rectangles, expand), group_colors, False)
+        return labels, estimate_draw_time(program, pacing, event_cost)
+
+    penalty = 0.0
+    labels, estimate = attempt(penalty)
+    plain_estimate = estimate
+
+    # Find a penalty that fits, doubling from the start value
+    low, high = 0.0, BUDGET_START_PENALTY
+    while estimate > seconds and penalty < BUDGET_MAX_PENALTY:
+        penalty = high
+        labels, estimate = attempt(penalty)
+        if estimate > seconds:
+            low, high = high, high * 2
+
+    # Bisect between the last penalty that was too slow and the first that fits
+    if penalty > 0 and estimate <= seconds:
+        for _ in range(iterations):
+            middle = (low + high) / 2
+            middle_labels, middle_estimate = attempt(middle)
+            if middle_estimate <= seconds:
+                high, labels, estimate = middle, middle_labels, middle_estimate
+            else:
+                low = middle
+        penalty = high
+
+    return labels, {
+        "penalty": round(penalty, 3),
+        "budget_seconds": seconds,
+        "estimated_seconds": round(estimate, 2),
+        "plain_estimated_seconds": round(plain_estimate, 2),
+        "fits": bool(estimate <= seconds),
+    }
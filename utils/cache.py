@@ -0,0 +1,132 @@
+import hashlib
+import json
+import os
+import numpy as np
+from utils.color import gartic_palette_hash
+from utils.strokes import StrokeProgram
+
+CACHE_DIR = os.path.join("temp", "cache")
+CACHE_MAX_BYTES = 512 * 1024 * 1024  # Least recently used entries are evicted beyond this
+
+
+def content_hash(data) -> str:
+    """
+    SHA-256 hex digest of raw bytes (e.g. an uploaded file's buffer).
+    """
+    return hashlib.sha256(data).hexdigest()
+
+
+def cache_key(*parts) -> str:
+    """
+    Key for a cached result, built from everything it depends on (hashes, sizes,
+    settings). The palette hash is always included, so a palette change misses the cache.
+
+    Returns:
+        str: 32 hex characters.
+    """
+    digest = hashlib.sha256(gartic_palette_hash().encode())
+    digest.update(repr(parts).encode())
+    return digest.hexdigest()[:32]
+
+
+def _cache_path(key: str, ext: str) -> str:
+    return os.path.join(CACHE_DIR, f"{key}{ext}")
+
+
+def _open_cached(key: str, ext: str) -> str | None:
+    """
+    Path of a cache entry, or None on a miss. Hits are marked as recently used.
+    Another process may still evict the entry before it is read: loaders treat an
+    OSError while reading as a miss too.
+    """
+    path = _cache_path(key, ext)
+    try:
+        os.utime(path)
+    except OSError:  # Not cached, or evicted by another process (batch workers)
+        return None
+    return path
+
+
+def _write_cached(key: str, ext: str, write):
+    """
+    Write an entry through `write(file)` atomically (temp file + rename), then evict.
+    """
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = _cache_path(key, ext)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "wb") as f:
+        write(f)
+    os.replace(temp_path, path)
+    evict_cache()
+
+
+def evict_cache(max_bytes: int = CACHE_MAX_BYTES):
+    """
+    Delete the least recently used entries until the cache fits in `max_bytes`.
+    """
+    if not os.path.isdir(CACHE_DIR):
+        return
+    entries = []
+    for entry in os.scandir(CACHE_DIR):
+        if entry.is_file() and not entry.name.endswith(".tmp"):
+            try:
+                stat = entry.stat()
+            except OSError:  # Evicted by another process meanwhile (batch workers)
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:  # Already gone (another rerun evicted it)
+            pass
+        total -= size
+
+
+def load_labels(key: str) -> np.ndarray | None:
+    """
+    Cached palette index map, or None on a miss.
+    """
+    path = _open_cached(key, ".npy")
+    if path is None:
+        return None
+    try:
+        return np.load(path)
+    except OSError:  # Evicted since
+        return None
+
+
+def save_labels(key: str, labels: np.ndarray):
+    """
+    Cache a palette index map under `key`.
+    """
+    _write_cached(key, ".npy", lambda f: np.save(f, labels))
+
+
+def load_program(key: str) -> tuple | None:
+    """
+    Cached (program, report) pair, or None on a miss.
+    """
+    path = _open_cached(key, ".npz")
+    if path is None:
+        return None
+    try:
+        with np.load(path) as data:
+            report = json.loads(str(data["report"]))
+        return StrokeProgram.load(path), report
+    except OSError:  # Evicted since
+        return None
+
+
+def save_program(key: str, program: StrokeProgram, report: dict):
+    """
+    Cache a compiled (and arranged) program with its ordering report under `key`.
+    The file is a regular StrokeProgram .npz with the report as an extra entry.
+    """
+    _write_cached(key, ".npz", lambda f: np.savez_compressed(
+        f, ops=program.ops, width=program.width, height=program.height, tool=program.tool,
+        report=json.dumps(report, default=float),
+    ))
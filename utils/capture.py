@@ -0,0 +1,109 @@
+import threading
+import numpy as np
+
+
+class CaptureService:
+    """
+    Long-lived screen grabber. Opening an mss handle sets up the OS capture objects
+    (device contexts and bitmaps on Windows), which mss keeps and reuses for as long as
+    the handle lives and the region size stays the same. Opening one per screenshot
+    throws that away every time.
+
+    mss handles can't be shared between threads, so each thread gets its own on first use.
+    Streamlit runs every rerun on a new thread: the handles of threads that have ended are
+    closed whenever a new one is opened, so they don't pile up over a session.
+    Grabs return views into the captured BGRA bytes: no conversion, no alpha-stripping copy.
+    """
+
+    def __init__(self):
+        # Imported here: headless tools (benchmarks, simulator) never capture the screen
+        try:
+            import mss
+        except ImportError:
+            raise RuntimeError("CaptureService needs the mss package")
+        self._mss = mss
+        self._local = threading.local()
+        self._handles = []  # (thread, handle) pairs
+        self._lock = threading.Lock()
+
+    def _handle(self):
+        sct = getattr(self._local, "sct", None)
+        if sct is None:
+            sct = self._local.sct = self._mss.mss()
+            with self._lock:
+                alive = []
+                for thread, old in self._handles:
+                    if thread.is_alive():
+                        alive.append((thread, old))
+                    else:
+                        old.close()
+                self._handles = alive + [(threading.current_thread(), sct)]
+        return sct
+
+    def grab_bgra(self, left: int, top: int, width: int, height: int) -> np.ndarray:
+        """
+        Capture a screen region.
+
+        Returns:
+            np.ndarray: Contiguous uint8 array of shape (height, width, 4), BGRA, viewing
+            the capture's own buffer.
+        """
+        shot = self._handle().grab({"left": int(left), "top": int(top), "width": int(width), "height": int(height)})
+        return np.frombuffer(shot.raw, dtype=np.uint8).reshape(shot.height, shot.width, 4)
+
+    def grab(self, left: int, top: int, width: int, height: int) -> np.ndarray:
+        """
+        Capture a screen region as a BGR view (the alpha channel is sliced off, not copied).
+        """
+        return self.grab_bgra(left, top, width, height)[..., :3]
+
+    def grab_bbox(self, bbox: dict) -> np.ndarray:
+        """
+        Capture a bounding box dict (see automations.get_bbox_from_clicks) as a BGR view.
+        """
+        return self.grab(bbox["left"], bbox["top"], bbox["width"], bbox["height"])
+
+    def grab_into(self, out: np.ndarray, left: int, top: int) -> np.ndarray:
+        """
+        Capture the region of `out`'s size at (left, top) into a preallocated BGR array,
+        for callers that keep frames around (e.g. comparing consecutive captures).
+        """
+        np.copyto(out, self.grab(left, top, out.shape[1], out.shape[0]))
+        return out
+
+    def grab_screen(self) -> tuple:
+        """
+        Capture all monitors at once.
+
+        Returns:
+            tuple: (image, origin): BGRA view of the capture and the screen position of
+            its top-left pixel.
+        """
+        monitor = self._handle().monitors[0]  # Bounding box of all monitors
+        return self.grab_bgra(monitor["left"], monitor["top"], monitor["width"], monitor["height"]), (monitor["left"], monitor["top"])
+
+    def close(self):
+        """
+        Release every thread's handle.
+        """
+        with self._lock:
+            for _, sct in self._handles:
+                sct.close()
+            self._handles.clear()
+        self._local = threading.local()
+
+
+_capture_service = None
+_capture_service_lock = threading.Lock()
+
+
+def get_capture_service() -> CaptureService:
+    """
+    The process-wide capture service, created on first use.
+    """
+    global _capture_service
+    if _capture_service is None:
+        with _capture_service_lock:  # The app's preload thread may be creating it right now
+            if _capture_service is None:
+                _capture_service = CaptureService()
+    return _capture_service
@@ -1,6 +1,7 @@
+import hashlib
+import os
 import cv2 as cv
 import numpy as np
-from skimage import color
 
 # Gartic's 18-color palette in BGR format
 gartic_colors_bgr = {
@@ -27,6 +28,43 @@ gartic_colors_bgr = {
 # Reverse mapping: BGR tuple to color name
 gartic_bgr_colornames = {val: key for key, val in gartic_colors_bgr.items()}
 
+# Palette as arrays, in the same order as gartic_colors_bgr.
+# A "label" is an index into these (uint8, one byte per pixel).
+gartic_color_names = list(gartic_colors_bgr.keys())
+gartic_palette_bgr = np.array(list(gartic_colors_bgr.values()), dtype=np.uint8)
+WHITE_LABEL = gartic_color_names.index("white")
+
+# Number of sampled pixels compared against the palette at once (bounds memory use)
+QUANTIZE_TILE_PIXELS = 1 << 16
+
+# On-disk BGR -> palette index lookup table. Bump the version when the matching changes.
+LUT_DIR = "temp"
+LUT_VERSION = 1
+_gartic_lut = None
+_gartic_palette_lab = None
+
+# scikit-image (and the scipy it pulls in) is imported on first use: it is only needed to
+# quantize without the lookup table, and importing it makes every app start slower
+
+
+def get_gartic_palette_lab() -> np.ndarray:
+    """
+    Returns the palette in LAB, converted exactly like get_closest_gartic_color_ciede2000
+    does. Built once per process.
+
+    Returns:
+        np.ndarray: float array of shape (18, 3), in palette order.
+    """
+    global _gartic_palette_lab
+
+    if _gartic_palette_lab is None:
+        from skimage import color
+        _gartic_palette_lab = color.rgb2lab(
+            (gartic_palette_bgr[:, ::-1].astype(np.float32) / 255.0)[np.newaxis, :, :]
+        )[0]
+
+    return _gartic_palette_lab
+
 
 def get_closest_gartic_color_ciede2000(bgr_pixel):
     """
@@ -38,6 +76,8 @@ def get_closest_gartic_color_ciede2000(bgr_pixel):
     Returns:
         tuple: (closest_color_bgr, color_name)
     """
+    from skimage import color
+
     # Convert BGR to normalized RGB [0, 1]
     rgb_pixel = np.array(bgr_pixel[::-1], dtype=np.float32) / 255.0
     lab_pixel = color.rgb2lab(rgb_pixel[np.newaxis, np.newaxis, :])[0][0]
@@ -56,6 +96,161 @@ def get_closest_gartic_color_ciede2000(bgr_pixel):
     return bgr_list[closest_index], color_names_list[closest_index]
 
 
+def bgr_to_lab(img: np.ndarray) -> np.ndarray:
+    """
+    Convert a BGR image to LAB, pixel for pixel identical to converting each pixel on its own.
+
+    skimage's rgb2lab runs one big matrix product over the whole image, which rounds
+    slightly differently than the 1x3 product used for a single pixel. The RGB -> XYZ
+    step is therefore done as a stack of 1x3 products here.
+
+    Args:
+        img (np.ndarray): Image in BGR format with shape (..., 3).
+
+    Returns:
+        np.ndarray: float32 LAB image with the same shape.
+    """
+    from skimage import color
+    from skimage.color.colorconv import xyz_from_rgb
+
+    arr = img[..., ::-1].astype(np.float32) / 255.0
+
+    # sRGB gamma expansion (same as skimage.color.rgb2xyz)
+    mask = arr > 0.04045
+    arr[mask] = np.power((arr[mask] + 0.055) / 1.055, 2.4)
+    arr[~mask] /= 12.92
+
+    xyz = (arr[..., np.newaxis, :] @ xyz_from_rgb.T.astype(np.float32))[..., 0, :]
+    return color.xyz2lab(xyz)
+
+
+def gartic_lab_distances(lab: np.ndarray) -> np.ndarray:
+    """
+    CIEDE2000 distance from every LAB value to every palette color.
+
+    Args:
+        lab (np.ndarray): LAB values with shape (..., 3).
+
+    Returns:
+        np.ndarray: Distances with shape (..., 18), in palette order.
+    """
+    from skimage import color
+
+    palette_lab = get_gartic_palette_lab()
+    lab = lab[..., np.newaxis, :]
+    palette = palette_lab.reshape((1,) * (lab.ndim - 2) + palette_lab.shape)
+    return color.deltaE_ciede2000(lab, palette)
+
+
+def closest_gartic_labels(img: np.ndarray, tile_pixels: int = QUANTIZE_TILE_PIXELS) -> np.ndarray:
+    """
+    Find the closest Gartic color index for every pixel of a BGR image using CIEDE2000.
+
+    The image is converted to LAB once and compared against the whole palette in one
+    broadcast, a band of rows at a time so memory stays bounded.
+
+    Args:
+        img (np.ndarray): Input image in BGR format.
+        tile_pixels (int): Roughly how many pixels are compared per band.
+
+    Returns:
+        np.ndarray: uint8 array of shape (h, w) with indices into gartic_color_names.
+    """
+    h, w = img.shape[:2]
+    labels = np.empty((h, w), dtype=np.uint8)
+    rows_per_tile = max(1, tile_pixels // max(w, 1))
+
+    for y in range(0, h, rows_per_tile):
+        lab = bgr_to_lab(img[y:y+rows_per_tile, :, :3])
+        labels[y:y+rows_per_tile] = np.argmin(gartic_lab_distances(lab), axis=-1)
+
+    return labels
+
+
+def gartic_labels(img: np.ndarray) -> np.ndarray:
+    """
+    Palette index of every pixel of a BGR image.
+
+    Uses the lookup table when it has been built (a single indexing operation),
+    otherwise falls back to closest_gartic_labels. Both give the same result.
+
+    Args:
+        img (np.ndarray): Input image in BGR format.
+
+    Returns:
+        np.ndarray: uint8 array of shape (h, w) with indices into gartic_color_names.
+    """
+    lut = get_gartic_lut()
+    if lut is None:
+        return closest_gartic_labels(img)
+    return lut[img[..., 0], img[..., 1], img[..., 2]]
+
+
+def screen_gartic_labels(img: np.ndarray) -> np.ndarray:
+    """
+    Palette index of every pixel of a screenshot of the canvas.
+
+    A canvas holds few distinct colors (the palette plus some anti-aliasing), so each
+    distinct color is matched once and the result is scattered back. Same result as
+    gartic_labels, and fast even without the lookup table.
+
+    Args:
+        img (np.ndarray): Screenshot in BGR (or BGRA) format.
+
+    Returns:
+        np.ndarray: uint8 array of shape (h, w) with indices into gartic_color_names.
+    """
+    bgr = img[..., :3].astype(np.int32)
+    packed = (bgr[..., 0] << 16) | (bgr[..., 1] << 8) | bgr[..., 2]
+    colors, inverse = np.unique(packed.ravel(), return_inverse=True)
+    distinct = np.stack([colors >> 16, (colors >> 8) & 255, colors & 255], axis=-1).astype(np.uint8)
+    return gartic_labels(distinct[np.newaxis])[0][inverse].reshape(packed.shape)
+
+
+def to_gartic_labels(img: cv.typing.MatLike, step: int = 1, workers: int = 1, dither: str = "none") -> np.ndarray:
+    """
+    Convert a BGR image to a map of Gartic palette indices (one byte per pixel).
+    Works by downsampling every `step` pixels to speed up the process.
+
+    Args:
+        img (cv.typing.MatLike): Input image in BGR format.
+        step (int): Size of square patch to process at once. Larger = faster, lower quality.
+        workers (int): Processes to quantize with (see utils.parallel). 1 = this process only.
+        dither (str): Dithering mode from utils.dither.DITHER_MODES. "none" = plain nearest color.
+
+    Returns:
+        np.ndarray: uint8 array of shape (h, w) where each patch holds the index of the closest Gartic color.
+    """
+    h, w = img.shape[:2]
+
+    # Quantize only the top-left pixel of every step x step block
+    if dither != "none":
+        from utils.dither import dither_labels  # utils.dither imports this module
+        labels = dither_labels(img[::step, ::step], dither)
+    elif workers == 1:
+        labels = gartic_labels(img[::step, ::step])
+    else:
+        from utils.parallel import parallel_gartic_labels  # utils.parallel imports this module
+        labels = parallel_gartic_labels(img[::step, ::step], workers)
+
+    # Fill the entire step x step block with the closest color
+    labels = np.repeat(np.repeat(labels, step, axis=0), step, axis=1)
+    return np.ascontiguousarray(labels[:h, :w])
+
+
+def render_labels(labels: np.ndarray) -> np.ndarray:
+    """
+    Render a map of palette indices as a BGR image (e.g. for previews).
+
+    Args:
+        labels (np.ndarray): uint8 array of palette indices.
+
+    Returns:
+        np.ndarray: BGR image with the same height and width.
+    """
+    return gartic_palette_bgr[labels]
+
+
 def to_gartic_colors(img: cv.typing.MatLike, step: int = 1) -> np.ndarray:
     """
     Convert a BGR image to use only the closest Gartic palette colors.
@@ -68,15 +263,89 @@ def to_gartic_colors(img: cv.typing.MatLike, step: int = 1) -> np.ndarray:
     Returns:
         np.ndarray: New image where each patch is filled with the closest Gartic color.
     """
-    h, w = img.shape[:2]
     out = np.zeros_like(img)
+    out[:, :, :3] = render_labels(to_gartic_labels(img, step))
+    return out
+
+def gartic_palette_hash() -> str:
+    """
+    Short hash identifying the palette and matching algorithm, used to key cached data.
 
-    for y in range(0, h, step):
-        for x in range(0, w, step):
-            pixel = tuple(img[y, x])  # Current BGR pixel
-            gcolor, _ = get_closest_gartic_color_ciede2000(pixel)
+    Returns:
+        str: 16 hex characters.
+    """
+    digest = hashlib.sha256(gartic_palette_bgr.tobytes())
+    digest.update(",".join(gartic_color_names).encode())
+    digest.update(f"ciede2000-v{LUT_VERSION}".encode())
+    return digest.hexdigest()[:16]
 
-            # Fill the entire step x step block with the closest color
-            out[y:y+step, x:x+step] = gcolor
 
-    return out
+def get_lut_path() -> str:
+    """
+    Returns the path of the lookup table file for the current palette.
+    """
+    return os.path.join(LUT_DIR, f"gartic_lut_v{LUT_VERSION}_{gartic_palette_hash()}.npy")
+
+
+def build_gartic_lut(path: str | None = None) -> str:
+    """
+    Build the full 24-bit BGR -> palette index lookup table and save it as a .npy file.
+
+    Every one of the 16.7M colors is matched with CIEDE2000, so the table gives exactly the
+    same answer as closest_gartic_labels. This takes about a minute and only has to be done
+    once per palette.
+
+    Args:
+        path (str): Where to write the table. Defaults to get_lut_path().
+
+    Returns:
+        str: Path of the written table.
+    """
+    path = path or get_lut_path()
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    # All (g, r) combinations for one blue value, as a 256x256 BGR image
+    g, r = np.meshgrid(np.arange(256, dtype=np.uint8), np.arange(256, dtype=np.uint8), indexing="ij")
+    plane = np.stack([np.zeros_like(g), g, r], axis=-1)
+
+    # Write to a temporary file first so a half-built table is never picked up
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    lut = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.uint8, shape=(256, 256, 256))
+    for b in range(256):
+        plane[:, :, 0] = b
+        lut[b] = closest_gartic_labels(plane)
+    lut.flush()
+    del lut
+    os.replace(tmp_path, path)
+
+    return path
+
+
+def get_gartic_lut(build: bool = False) -> np.ndarray | None:
+    """
+    Returns the BGR -> palette index lookup table, memory-mapped from disk.
+
+    The table is mapped read-only once per process, so all processes share the same pages.
+
+    Args:
+        build (bool): Build the table if it does not exist yet.
+
+    Returns:
+        np.ndarray | None: uint8 array indexed as lut[b, g, r], or None if it is not built.
+    """
+    global _gartic_lut
+
+    if _gartic_lut is None:
+        path = get_lut_path()
+        if not os.path.exists(path):
+            if not build:
+                return None
+            build_gartic_lut(path)
+        _gartic_lut = np.load(path, mmap_mode="r")
+
+    return _gartic_lut
+
+
+if __name__ == "__main__":
+    # python -m utils.color  ->  build the lookup table ahead of time
+    print(f"Lookup table written to {build_gartic_lut()}")
@@ -0,0 +1,206 @@
+import json
+import os
+import cv2 as cv
+import numpy as np
+from utils.color import gartic_color_names, gartic_palette_bgr, WHITE_LABEL
+
+LAYOUT_FILE = os.path.join("temp", "layout.json")
+CALIBRATION_FILE = os.path.join("temp", "calibration.json")
+
+MIN_CANVAS_SHARE = 0.02  # The canvas covers at least this share of the screen
+MIN_SWATCH_SIZE = 8  # Smallest swatch side in pixels
+SWATCH_MIN_FILL = 0.75  # Share of its bounding box a swatch fills (allows rounded corners)
+SWATCH_SIZE_TOLERANCE = 0.25  # All swatches are this close to the same size
+
+
+def _packed_colors(screen: np.ndarray) -> np.ndarray:
+    """
+    Every pixel's B, G, R packed into one int (B | G << 8 | R << 16). A contiguous BGRA
+    capture is reinterpreted in place instead of being converted.
+    """
+    if screen.ndim == 3 and screen.shape[2] == 4 and screen.dtype == np.uint8 and screen.flags.c_contiguous:
+        return screen.view(np.uint32)[..., 0] & 0xFFFFFF
+    bgr = screen[..., :3].astype(np.uint32)
+    return bgr[..., 0] | (bgr[..., 1] << 8) | (bgr[..., 2] << 16)
+
+
+def _palette_packed() -> np.ndarray:
+    bgr = gartic_palette_bgr.astype(np.uint32)
+    return bgr[:, 0] | (bgr[:, 1] << 8) | (bgr[:, 2] << 16)
+
+
+def _bbox(left: int, top: int, width: int, height: int) -> dict:
+    """
+    Bounding box of a pixel rectangle, in the format of automations.get_bbox_from_clicks
+    (right/bottom are the last pixels inside).
+    """
+    right, bottom = left + width - 1, top + height - 1
+    return {"width": right - left, "height": bottom - top, "left": left, "right": right, "top": top, "bottom": bottom}
+
+
+def detect_layout(screen: np.ndarray, origin: tuple = (0, 0)) -> dict | None:
+    """
+    Find the drawing canvas and the palette swatches in a screenshot of Gartic Phone.
+
+    Pixels exactly matching a palette color are split into same-color shapes with one
+    connected components pass: a pixel only joins when its right and bottom neighbours
+    have its color, so touching shapes of different colors stay apart (each loses its
+    last column and row, which is added back). The canvas is the largest white shape.
+    The swatches are squares of one common size, one per palette color, picked closest
+    to the middle of the other swatches. Only the inside of shapes has to match exactly,
+    so any UI scaling works. Run it on a blank canvas.
+
+    Args:
+        screen (np.ndarray): Full-screen capture, BGR or BGRA.
+        origin (tuple): Screen position of the capture's top-left pixel.
+
+    Returns:
+        dict: drawing_bbox, colors_bbox and palette_xys (color name -> (x, y) swatch
+        center), in screen coordinates. None if the canvas or a swatch wasn't found.
+    """
+    packed = _packed_colors(screen)
+    palette = _palette_packed()
+    height, width = packed.shape
+    ox, oy = origin
+
+    inner = packed == palette[0]
+    for value in palette[1:]:
+        inner |= packed == value
+    inner[:, :-1] &= packed[:, 1:] == packed[:, :-1]
+    inner[:-1] &= packed[1:] == packed[:-1]
+    count, components, stats, centroids = cv.connectedComponentsWithStats(inner.view(np.uint8), connectivity=4)
+    ids = np.arange(1, count)
+    stats, centroids = stats[1:], centroids[1:] + 0.5
+
+    # Color of every shape: at its centroid, or its top-left corner if the centroid is outside (rectangles)
+    cx = np.clip(centroids[:, 0].astype(int), 0, width - 1)
+    cy = np.clip(centroids[:, 1].astype(int), 0, height - 1)
+    left, top = stats[:, cv.CC_STAT_LEFT], stats[:, cv.CC_STAT_TOP]
+    at_centroid = components[cy, cx] == ids
+    at_corner = components[top, left] == ids
+    values = np.where(at_centroid, packed[cy, cx], packed[top, left])
+    order = np.argsort(palette)
+    labels = order[np.clip(np.searchsorted(palette[order], values), 0, len(palette) - 1)]
+    known = (at_centroid | at_corner) & (palette[labels] == values)
+
+    w, h = stats[:, cv.CC_STAT_WIDTH] + 1, stats[:, cv.CC_STAT_HEIGHT] + 1
+    area = stats[:, cv.CC_STAT_AREA]
+
+    # Canvas: the largest white shape
+    white = np.flatnonzero(known & (labels == WHITE_LABEL))
+    if len(white) == 0:
+        return None
+    largest = white[np.argmax(area[white])]
+    if w[largest] * h[largest] < MIN_CANVAS_SHARE * height * width:
+        return None
+    canvas = _bbox(int(left[largest]) + ox, int(top[largest]) + oy, int(w[largest]), int(h[largest]))
+
+    # Swatch candidates: filled, square-ish shapes
+    square = (known & (np.minimum(w, h) >= MIN_SWATCH_SIZE) & (np.maximum(w, h) <= 2 * np.minimum(w, h))
+              & (area >= SWATCH_MIN_FILL * (w - 1) * (h - 1)))
+    square[largest] = False
+    if not square.any():
+        return None
+    centers = centroids[square]
+    labels = labels[square]
+    sizes = np.sqrt(w[square] * h[square])
+
+    # The swatch size shared by the most palette colors
+    close = np.abs(sizes[:, np.newaxis] - sizes[np.newaxis, :]) <= SWATCH_SIZE_TOLERANCE * sizes[:, np.newaxis]
+    colors_near = [len(np.unique(labels[row])) for row in close]
+    best = int(np.argmax(colors_near))
+    if colors_near[best] < len(gartic_color_names):
+        return None
+    centers, labels, sizes = centers[close[best]], labels[close[best]], sizes[close[best]]
+
+    # Per color, the candidate closest to the middle of the palette (refined once)
+    middle = np.median(centers, axis=0)
+    for _ in range(2):
+        distance = np.linalg.norm(centers - middle, axis=1)
+        chosen = [np.flatnonzero(labels == label)[np.argmin(distance[labels == label])]
+                  for label in range(len(gartic_color_names))]
+        middle = np.median(centers[chosen], axis=0)
+
+    swatches = np.floor(centers[chosen]).astype(int) + (ox, oy)
+    palette_xys = {name: (int(x), int(y)) for name, (x, y) in zip(gartic_color_names, swatches)}
+
+    half = int(np.median(sizes[chosen])) // 2
+    x0, y0 = swatches.min(axis=0) - half
+    x1, y1 = swatches.max(axis=0) + half
+
+    return {
+        "drawing_bbox": canvas,
+        "colors_bbox": _bbox(int(x0), int(y0), int(x1 - x0 + 1), int(y1 - y0 + 1)),
+        "palette_xys": palette_xys,
+    }
+
+
+def layout_matches(screen: np.ndarray, layout: dict, origin: tuple = (0, 0)) -> bool:
+    """
+    Whether a detected layout still fits a screenshot: every swatch center shows its
+    color and the canvas corners are white.
+    """
+    packed = _packed_colors(screen)
+    palette = _palette_packed()
+    ox, oy = origin
+    canvas = layout["drawing_bbox"]
+    points = [(xy, palette[gartic_color_names.index(name)]) for name, xy in layout["palette_xys"].items()]
+    points += [((x, y), palette[WHITE_LABEL]) for x in (canvas["left"], canvas["right"]) for y in (canvas["top"], canvas["bottom"])]
+
+    for (x, y), value in points:
+        x, y = x - ox, y - oy
+        if not (0 <= y < packed.shape[0] and 0 <= x < packed.shape[1]) or packed[y, x] != value:
+            return False
+    return True
+
+
+def get_layout(screen: np.ndarray, origin: tuple = (0, 0), path: str = LAYOUT_FILE) -> dict | None:
+    """
+    detect_layout with a cache per screen resolution: a saved layout is reused as long
+    as it still matches the screenshot, otherwise the layout is detected again and saved.
+    """
+    resolution = f"{screen.shape[1]}x{screen.shape[0]}"
+    cached = {}
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            cached = json.load(f)
+
+    layout = cached.get(resolution)
+    if layout is not None:
+        layout["palette_xys"] = {name: tuple(xy) for name, xy in layout["palette_xys"].items()}
+        if layout_matches(screen, layout, origin):
+            return layout
+
+    layout = detect_layout(screen, origin)
+    if layout is not None:
+        cached[resolution] = layout
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(cached, f, indent=2)
+    return layout
+
+
+def save_calibration(layout: dict, path: str = CALIBRATION_FILE):
+    """
+    Save a canvas and palette layout (detected or clicked) so later sessions and the batch
+    runner can draw without setting the areas again.
+
+    Args:
+        layout (dict): drawing_bbox, colors_bbox (may be None) and palette_xys.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path + ".tmp", "w") as f:
+        json.dump(layout, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def load_calibration(path: str = CALIBRATION_FILE) -> dict | None:
+    """
+    The saved layout (see save_calibration), or None if there is none.
+    """
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        layout = json.load(f)
+    layout["palette_xys"] = {name: tuple(xy) for name, xy in layout["palette_xys"].items()}
+    return layout
@@ -0,0 +1,75 @@
+import numpy as np
+from utils.strokes import StrokeProgram, SKIP_LABEL, plan_strokes
+from utils.session import missing_strokes
+
+DIFF_MIN_MATCH = 0.9  # A pen line counts as drawn when this share of its pixels shows its color
+DIFF_SLACK = 1  # ... within this many pixels, for pens a little wider or thinner than PEN_WIDTH
+
+
+def diff_labels(target: np.ndarray, canvas: np.ndarray, step: int) -> np.ndarray:
+    """
+    Mark the parts of a target that the canvas already shows with SKIP_LABEL, so the
+    box planners only draw the rest.
+
+    The box planner paints each scanned row's colors over the `step` rows below it, so a
+    pixel is only skipped when the canvas already shows its color on all those rows.
+
+    Args:
+        target (np.ndarray): Palette index map to draw.
+        canvas (np.ndarray): Palette index map of the captured drawing area.
+        step (int): Drawing step the program will be planned with.
+
+    Returns:
+        np.ndarray: Copy of `target` with SKIP_LABEL where nothing needs drawing.
+    """
+    h, w = target.shape
+    canvas = canvas[:h, :w]
+    labels = target.copy()
+
+    # What the box planner leaves on every row: the colors of the scanned row above it
+    scanned = target[::step]
+    drawn = np.repeat(scanned, step, axis=0)[:h]
+    matches = canvas == drawn
+
+    # Pad to whole bands and require a match on every row of the band
+    bands = len(scanned)
+    padded = np.ones((bands * step, w), dtype=bool)
+    padded[:h] = matches
+    band_done = padded.reshape(bands, step, w).all(axis=1)
+    labels[::step][band_done] = SKIP_LABEL
+    return labels
+
+
+def plan_diff_strokes(
+    target: np.ndarray,
+    canvas: np.ndarray,
+    tool: str,
+    step: int,
+    rectangles: bool = False
+) -> StrokeProgram:
+    """
+    Plan only the strokes needed to turn the captured canvas into the target.
+
+    Box tool: pixels that already show the right color are skipped, whatever that color
+    is (white is drawn where the canvas isn't white). Boxes are not expanded, as that
+    would paint over pixels that are already right.
+
+    Pen tool: a line covers more than its sampled pixels, so the full program is planned
+    and only the lines where less than DIFF_MIN_MATCH of their pixels show their color
+    (within DIFF_SLACK pixels) are kept. The tolerance absorbs the edges that a wider or
+    anti-aliased in-game pen paints over neighbouring lines.
+
+    Args:
+        target (np.ndarray): Palette index map to draw.
+        canvas (np.ndarray): Palette index map of the captured drawing area (e.g.
+            utils.color.screen_gartic_labels of a screenshot).
+        tool (str): "box" or "pen".
+        step (int): Drawing step.
+        rectangles (bool): Merge box rows into rectangles.
+
+    Returns:
+        StrokeProgram: The compiled program, in scanline order.
+    """
+    if tool == "pen":
+        return missing_strokes(plan_strokes(target, tool, step), canvas, min_match=DIFF_MIN_MATCH, slack=DIFF_SLACK)
+    return plan_strokes(diff_labels(target, canvas, step), tool, step, rectangles, expand=0, background=None)
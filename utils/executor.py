@@ -0,0 +1,84 @@
+import threading
+import time
+import numpy as np
+from utils.color import gartic_color_names
+from utils.strokes import StrokeProgram, OP_COLOR, OP_DRAG
+from utils.backends import InputBackend, EV_MOVE, EV_PRESS, EV_RELEASE, EV_SLEEP
+from utils.pacing import PacingProfile, classic_profile
+
+EXECUTOR_CHUNK = 64  # Ops turned into one event batch; 'q' is checked between batches
+
+
+def run_stroke_program(
+    program: StrokeProgram,
+    backend: InputBackend,
+    palette_xys: dict,
+    drawing_bbox: dict,
+    stop_event: threading.Event | None = None,
+    pacing: PacingProfile | None = None,
+    start: int = 0,
+    progress=None,
+    trace=None
+) -> int:
+    """
+    Send a compiled stroke program to an input backend, in batches of EXECUTOR_CHUNK ops.
+
+    Args:
+        program (StrokeProgram): Program from utils.strokes.plan_strokes (or StrokeProgram.load).
+        backend (InputBackend): Where the input goes (real mouse or simulated canvas).
+        palette_xys (dict): Mapping of color name to screen position.
+        drawing_bbox (dict): Bounding box of drawing canvas on screen.
+        stop_event (threading.Event): Stops before the next op once set.
+        pacing (PacingProfile): Delays around each event. Defaults to the classic delays of the tool.
+        start (int): Op to start at, e.g. a checkpoint of an interrupted run. The color in
+            effect at that op is selected first.
+        progress (callable): Called with the position reached after every batch.
+        trace (DrawTrace): Counts every batch sent (see utils.telemetry).
+
+    Returns:
+        int: Position reached: the number of ops done, counting the skipped ones before `start`.
+    """
+    drawing_area_left = drawing_bbox["left"]
+    drawing_area_top = drawing_bbox["top"]
+    pacing = pacing or classic_profile(program.tool)
+
+    palette = [palette_xys[name] for name in gartic_color_names]
+    count = len(program.ops)
+    ops = program.ops[start:].tolist()  # Only the ops to send, so resuming late in a long program stays cheap
+
+    # Zero delays are left out, so backends that inject between sleeps get longer batches
+    color_pause = [(EV_SLEEP, pacing.color_change)] if pacing.color_change > 0 else []
+    press_pause = [(EV_SLEEP, pacing.drag_press)] if pacing.drag_press > 0 else []
+    move_pause = [(EV_SLEEP, pacing.drag_move)] if pacing.drag_move > 0 else []
+
+    events = []
+    if 0 < start < count and ops[0][0] != OP_COLOR:
+        earlier_colors = np.flatnonzero(program.ops[:start, 0] == OP_COLOR)
+        if len(earlier_colors):
+            x, y = palette[program.ops[earlier_colors[-1], 1]]
+            events += [(EV_MOVE, int(x), int(y)), (EV_PRESS,), (EV_RELEASE,), *color_pause]
+
+    executed = start
+    for chunk_start in range(start, count, EXECUTOR_CHUNK):
+        if stop_event is not None and stop_event.is_set():
+            break
+
+        for op, a, b, c, d in ops[chunk_start - start:chunk_start - start + EXECUTOR_CHUNK]:
+            if op == OP_COLOR:
+                x, y = palette[a]
+                events += [(EV_MOVE, int(x), int(y)), (EV_PRESS,), (EV_RELEASE,), *color_pause]
+            elif op == OP_DRAG:
+                events += [
+                    (EV_MOVE, drawing_area_left + a, drawing_area_top + b), (EV_PRESS,), *press_pause,
+                    (EV_MOVE, drawing_area_left + c, drawing_area_top + d), *move_pause, (EV_RELEASE,),
+                ]
+        sent_at = time.perf_counter()
+        backend.send(events)
+        events = []
+        executed = min(chunk_start + EXECUTOR_CHUNK, count)
+        if trace is not None:
+            trace.record_batch(program.ops[chunk_start:executed], program.tool, time.perf_counter() - sent_at, pacing)
+        if progress is not None:
+            progress(executed)
+
+    return executed
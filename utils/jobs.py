@@ -0,0 +1,145 @@
+import ctypes
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from utils.image import to_opencv_img, resize_img
+from utils.color import to_gartic_labels
+from utils.cache import content_hash, cache_key, load_labels, save_labels
+from utils.strokes import StrokeProgram
+from utils.pipeline import plan_drawing
+from utils.parallel import default_workers
+from utils.telemetry import DrawTrace
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".webp")
+_BELOW_NORMAL_PRIORITY_CLASS = 0x4000
+
+
+@dataclass(frozen=True)
+class JobOptions:
+    """
+    How every image of a batch is converted and planned, like the app's controls.
+    """
+    tool: str = "pen"
+    details: int = 9  # Detail level 1-10: the palette conversion works on (11 - details) pixel blocks
+    step: int = 2
+    dither: str = "none"
+    rectangles: bool = False
+    group_colors: bool = False
+    optimize_travel: bool = False
+
+
+@dataclass
+class DrawJob:
+    """
+    One prepared image of a batch.
+
+    Attributes:
+        path (str): Image file.
+        program (StrokeProgram): Arranged program, None if preparing failed.
+        report (dict): What the ordering passes saved (see utils.ordering.arrange_strokes).
+        phases (dict): Seconds spent decoding, resizing, quantizing and planning (see utils.telemetry).
+        labels_key (str): Cache key of the converted image (see utils.cache).
+        error (str): Why preparing failed, None if it didn't.
+    """
+    path: str
+    program: StrokeProgram | None = None
+    report: dict = field(default_factory=dict)
+    phases: dict = field(default_factory=dict)
+    labels_key: str | None = None
+    error: str | None = None
+
+
+def find_images(paths: list) -> list:
+    """
+    The image files among `paths`; directories are replaced by the images directly in
+    them, sorted by name.
+    """
+    images = []
+    for path in paths:
+        if os.path.isdir(path):
+            names = sorted(name for name in os.listdir(path) if name.lower().endswith(IMAGE_EXTENSIONS))
+            images += [os.path.join(path, name) for name in names]
+        else:
+            images.append(path)
+    return images
+
+
+def prepare_job(path: str, width: int, height: int, options: JobOptions) -> DrawJob:
+    """
+    Decode, resize, convert and plan one image for a canvas of width x height. Converted
+    images and plans go through the same cache as the app, so repeated images are instant.
+    """
+    trace = DrawTrace()
+    with open(path, "rb") as f:
+        data = f.read()
+    with trace.phase("decode"):
+        img = to_opencv_img(data)
+    if img is None:
+        raise ValueError("not a readable image")
+    with trace.phase("resize"):
+        img = resize_img(img, width, height)
+
+    quantize_step = 11 - options.details
+    image_key = cache_key(content_hash(data), img.shape[1], img.shape[0])
+    labels_key = cache_key(image_key, quantize_step, options.dither)
+    labels = load_labels(labels_key)
+    if labels is None:
+        with trace.phase("quantize"):
+            labels = to_gartic_labels(img, step=quantize_step, dither=options.dither)
+        save_labels(labels_key, labels)
+
+    with trace.phase("plan"):
+        program, report, _ = plan_drawing(labels, options.tool, options.step, options.rectangles,
+                                          options.group_colors, options.optimize_travel, labels_key)
+    return DrawJob(path, program, report, trace.phases, labels_key)
+
+
+def _lower_priority():
+    """
+    Worker initializer: prepare at below-normal priority, so the planning of the next
+    images doesn't disturb the input timing of the drawing in progress.
+    """
+    if hasattr(os, "nice"):
+        os.nice(10)
+    else:
+        kernel32 = ctypes.windll.kernel32
+        kernel32.SetPriorityClass(kernel32.GetCurrentProcess(), _BELOW_NORMAL_PRIORITY_CLASS)
+
+
+class JobQueue:
+    """
+    A batch of images prepared ahead of drawing: all of them are submitted to a process
+    pool right away, so while one image is being drawn the next ones are converted and
+    planned, and each is usually ready before the previous drawing ends.
+
+    Iterating yields the jobs in order, each as soon as it is ready. Use as a context
+    manager, or call close() to stop the workers.
+    """
+
+    def __init__(self, paths: list, width: int, height: int, options: JobOptions, workers: int | None = None):
+        self.options = options
+        self._executor = ProcessPoolExecutor(max_workers=workers or default_workers(), initializer=_lower_priority)
+        self._futures = [(path, self._executor.submit(prepare_job, path, width, height, options)) for path in paths]
+
+    def __len__(self) -> int:
+        return len(self._futures)
+
+    def __iter__(self):
+        for path, future in self._futures:
+            try:
+                yield future.result()
+            except Exception as e:  # One bad image doesn't end the batch
+                yield DrawJob(path, error=f"{type(e).__name__}: {e}")
+
+    def ready(self) -> int:
+        """Jobs prepared so far."""
+        return sum(future.done() for _, future in self._futures)
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def __enter__(self) -> "JobQueue":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,276 @@
+import math
+import time
+import numpy as np
+from utils.strokes import StrokeProgram, compile_ops, group_by_color, color_change_savings
+
+LONG_MOVE = 50  # Cursor moves longer than this many pixels count as "long" in travel_stats
+TWO_OPT_NEIGHBORS = 8  # Candidate segments checked per position in 2-opt
+TWO_OPT_MAX_REVERSE = 5000  # Longest stretch of the tour a single 2-opt move may reverse
+
+
+def travel_stats(program: StrokeProgram, long_move: int = LONG_MOVE) -> dict:
+    """
+    Cursor travel between drags (pen up) for a program.
+
+    Args:
+        program (StrokeProgram): The program to measure.
+        long_move (int): Moves longer than this (pixels) are counted separately.
+
+    Returns:
+        dict: travel (total pixels), long_moves (count), drags.
+    """
+    segments = program.segments.astype(np.float64)
+    moves = np.hypot(segments[1:, 0] - segments[:-1, 2], segments[1:, 1] - segments[:-1, 3])
+    return {
+        "travel": float(moves.sum()),
+        "long_moves": int(np.count_nonzero(moves > long_move)),
+        "drags": len(segments),
+    }
+
+
+def _layer_travel(segments: np.ndarray, cursor: tuple) -> float:
+    """
+    Cursor travel to draw the segments in order, starting from the cursor.
+    """
+    xs = np.r_[cursor[0], segments[:, 2]].astype(np.float64)
+    ys = np.r_[cursor[1], segments[:, 3]].astype(np.float64)
+    return float(np.hypot(segments[:, 0] - xs[:-1], segments[:, 1] - ys[:-1]).sum())
+
+
+def _nearest_neighbor_order(segments: np.ndarray, cursor: tuple) -> tuple:
+    """
+    Greedy tour: from the cursor, always draw the closest undrawn segment next, entering
+    it from whichever end is closer. Endpoints are kept in a uniform grid so each lookup
+    only scans the cells around the cursor.
+
+    Returns:
+        tuple: (order, flipped) lists; flipped[i] means the i-th drawn segment is drawn end to start.
+    """
+    n = len(segments)
+    xs = np.concatenate([segments[:, 0], segments[:, 2]]).astype(np.float64)
+    ys = np.concatenate([segments[:, 1], segments[:, 3]]).astype(np.float64)
+
+    # About two endpoints per cell
+    width = xs.max() - xs.min() + 1
+    height = ys.max() - ys.min() + 1
+    cell = max(1.0, math.sqrt(width * height / max(n, 1)))
+    origin_x, origin_y = xs.min(), ys.min()
+    gx = ((xs - origin_x) // cell).astype(np.int64)
+    gy = ((ys - origin_y) // cell).astype(np.int64)
+    grid_w, grid_h = int(gx.max()) + 1, int(gy.max()) + 1
+
+    # cell id -> endpoint ids (endpoint k belongs to segment k % n; k >= n is the segment's end)
+    cell_ids = gy * grid_w + gx
+    by_cell = np.argsort(cell_ids, kind="stable")
+    bounds = np.flatnonzero(np.diff(cell_ids[by_cell])) + 1
+    grid = {
+        int(cell_ids[group[0]]): group.tolist()
+        for group in np.split(by_cell, bounds)
+    }
+
+    xs, ys = xs.tolist(), ys.tolist()
+    cell_ids = cell_ids.tolist()
+    cx, cy = cursor
+    order, flipped = [], []
+
+    for _ in range(n):
+        ccx = min(max(int((cx - origin_x) // cell), 0), grid_w - 1)
+        ccy = min(max(int((cy - origin_y) // cell), 0), grid_h - 1)
+        best, best_d = -1, math.inf
+        r = 0
+
+        while True:
+            # Cells on the square ring at Chebyshev distance r from the cursor cell
+            for y in range(max(ccy - r, 0), min(ccy + r, grid_h - 1) + 1):
+                on_edge = y == ccy - r or y == ccy + r
+                x_range = range(max(ccx - r, 0), min(ccx + r, grid_w - 1) + 1) if on_edge else (ccx - r, ccx + r)
+                for x in x_range:
+                    if x < 0 or x >= grid_w:
+                        continue
+                    bucket = grid.get(y * grid_w + x)
+                    if not bucket:
+                        continue
+                    for k in bucket:
+                        d = (xs[k] - cx) ** 2 + (ys[k] - cy) ** 2
+                        if d < best_d:
+                            best, best_d = k, d
+
+            # Everything beyond ring r is at least r cells away
+            if best >= 0 and best_d <= (r * cell) ** 2:
+                break
+            if r > max(grid_w, grid_h):
+                break
+            r += 1
+
+        seg = best % n
+        is_end = best >= n
+        # Both endpoints of a drawn segment leave the grid
+        grid[cell_ids[seg]].remove(seg)
+        grid[cell_ids[seg + n]].remove(seg + n)
+        order.append(seg)
+        flipped.append(is_end)
+        # The cursor ends up at the other end of the segment
+        other = seg if is_end else seg + n
+        cx, cy = xs[other], ys[other]
+
+    return order, flipped
+
+
+def _two_opt(segments: np.ndarray, order: list, flipped: list, deadline: float) -> tuple:
+    """
+    Improve a tour with 2-opt moves until no move helps or the deadline passes.
+
+    Reversing tour positions a+1..b also flips every segment in that stretch, which
+    replaces the moves end(a) -> start(a+1) and end(b) -> start(b+1) by
+    end(a) -> end(b) and start(a+1) -> start(b+1). Candidates for b are the segments
+    with an endpoint close to end(a).
+
+    Returns:
+        tuple: Improved (order, flipped).
+    """
+    from scipy.spatial import cKDTree  # Only the travel optimizer needs scipy
+
+    n = len(order)
+    if n < 3:
+        return order, flipped
+
+    # Coordinates by tour position, in drawing direction
+    seg = segments[order].astype(np.float64)
+    flip = np.array(flipped)
+    seg[flip] = seg[flip][:, [2, 3, 0, 1]]
+    sx, sy, ex, ey = (seg[:, i].tolist() for i in range(4))
+
+    tour = list(order)
+    flips = list(flipped)
+    pos = [0] * n
+    for i, s in enumerate(tour):
+        pos[s] = i
+
+    # Nearest endpoints of every endpoint (endpoint k belongs to segment k % n)
+    points = np.concatenate([segments[:, :2], segments[:, 2:]]).astype(np.float64)
+    k = min(TWO_OPT_NEIGHBORS + 1, len(points))
+    _, neighbors = cKDTree(points).query(points, k=k)
+    neighbors = (neighbors % n).tolist()
+
+    def dist(x0, y0, x1, y1):
+        return math.sqrt((x0 - x1) ** 2 + (y0 - y1) ** 2)
+
+    improved = True
+    while improved and time.perf_counter() < deadline:
+        improved = False
+        for a in range(n - 1):
+            if (a & 255) == 0 and time.perf_counter() >= deadline:
+                break
+
+            s = tour[a]
+            # Original endpoint id of the current end of segment s
+            end_id = s if flips[a] else s + n
+            old_a = dist(ex[a], ey[a], sx[a + 1], sy[a + 1])
+
+            for c in neighbors[end_id]:
+                b = pos[c]
+                if b <= a + 1 or b - a > TWO_OPT_MAX_REVERSE:
+                    continue
+
+                old_b = dist(ex[b], ey[b], sx[b + 1], sy[b + 1]) if b + 1 < n else 0.0
+                new_a = dist(ex[a], ey[a], ex[b], ey[b])
+                new_b = dist(sx[a + 1], sy[a + 1], sx[b + 1], sy[b + 1]) if b + 1 < n else 0.0
+                if new_a + new_b < old_a + old_b - 1e-9:
+                    # Reverse positions a+1..b and flip the segments in between
+                    lo, hi = a + 1, b + 1
+                    sx[lo:hi], ex[lo:hi] = ex[lo:hi][::-1], sx[lo:hi][::-1]
+                    sy[lo:hi], ey[lo:hi] = ey[lo:hi][::-1], sy[lo:hi][::-1]
+                    tour[lo:hi] = tour[lo:hi][::-1]
+                    flips[lo:hi] = [not f for f in flips[lo:hi][::-1]]
+                    for i in range(lo, hi):
+                        pos[tour[i]] = i
+                    improved = True
+                    old_a = dist(ex[a], ey[a], sx[a + 1], sy[a + 1])
+
+    return tour, flips
+
+
+def optimize_travel(program: StrokeProgram, time_budget: float = 2.0, cursor: tuple = (0, 0)) -> StrokeProgram:
+    """
+    Reorder the drags inside every color layer (run of drags with the same color) to cut
+    cursor travel: nearest neighbor over a spatial grid, then 2-opt within the time budget.
+    Segments may be drawn in either direction; the color order of the program is kept.
+
+    Works best on a program from utils.strokes.group_by_color, where every color is one layer.
+
+    Args:
+        program (StrokeProgram): The program to reorder.
+        time_budget (float): Seconds of 2-opt, shared between layers by size.
+        cursor (tuple): Canvas position of the cursor before the first drag.
+
+    Returns:
+        StrokeProgram: The reordered program.
+    """
+    segments = program.segments
+    labels = program.segment_labels
+    n = len(segments)
+    if n == 0:
+        return program
+
+    starts = np.flatnonzero(np.r_[True, labels[1:] != labels[:-1]])
+    ends = np.r_[starts[1:], n]
+
+    out = []
+    for start, end in zip(starts, ends):
+        layer = segments[start:end]
+
+        order, flipped = _nearest_neighbor_order(layer, cursor)
+        deadline = time.perf_counter() + time_budget * len(layer) / n
+        order, flipped = _two_opt(layer, order, flipped, deadline)
+
+        optimized = layer[order]
+        flip = np.array(flipped)
+        optimized[flip] = optimized[flip][:, [2, 3, 0, 1]]
+
+        # Never make a layer worse than it came in (e.g. already serpentine)
+        if _layer_travel(optimized, cursor) < _layer_travel(layer, cursor):
+            layer = optimized
+        out.append(layer)
+        cursor = (layer[-1, 2], layer[-1, 3])
+
+    return StrokeProgram(compile_ops(np.concatenate(out), labels), program.width, program.height, program.tool)
+
+
+def arrange_strokes(
+    program: StrokeProgram,
+    group_colors: bool = False,
+    optimize: bool = False,
+    time_budget: float = 2.0
+) -> tuple:
+    """
+    Apply the optional drawing-order passes to a scanline program and report what they saved.
+
+    Args:
+        program (StrokeProgram): Program straight from a planner (scanline order).
+        group_colors (bool): Draw each color in one pass (utils.strokes.group_by_color).
+        optimize (bool): Reorder each color layer to cut cursor travel (optimize_travel).
+        time_budget (float): Seconds of 2-opt for optimize_travel.
+
+    Returns:
+        tuple: (program, report). The report holds the palette switch savings and the
+        cursor travel before/after; it is empty when no pass ran.
+    """
+    report = {}
+    arranged = program
+
+    if group_colors:
+        arranged = group_by_color(arranged)
+        report.update(color_change_savings(program, arranged))
+
+    if optimize:
+        before = travel_stats(arranged)
+        arranged = optimize_travel(arranged, time_budget)
+        after = travel_stats(arranged)
+        report.update({
+            "travel_before": before["travel"],
+            "travel_after": after["travel"],
+            "long_moves_before": before["long_moves"],
+            "long_moves_after": after["long_moves"],
+        })
+
+    return arranged, report
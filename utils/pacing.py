@@ -0,0 +1,194 @@
+import json
+import os
+import time
+from dataclasses import dataclass, asdict
+import numpy as np
+from utils.color import gartic_color_names, gartic_labels
+from utils.strokes import StrokeProgram, COLOR_CHANGE_DELAY, DRAG_DELAY
+
+# Below this many seconds of remaining wait, spin on the high-resolution clock instead of sleeping
+SPIN_THRESHOLD = 0.002
+
+PACING_FILE = os.path.join("temp", "pacing.json")
+
+# Candidate delays tried by calibrate_pacing, slowest first (seconds)
+CALIBRATION_DELAYS = (0.008, 0.005, 0.003, 0.002, 0.001, 0.0005, 0.00025, 0.0)
+CALIBRATION_MARGIN = 1.5  # Calibrated delays are padded by this factor
+CALIBRATION_STROKES = 6  # Test strokes per candidate delay
+
+
+@dataclass(frozen=True)
+class PacingProfile:
+    """
+    How long the executor waits around each input event (seconds).
+
+    Attributes:
+        name (str): Name shown in the UI.
+        drag_press (float): After pressing the button at the start of a drag.
+        drag_move (float): After moving to the end of a drag, before releasing.
+        color_change (float): After clicking a palette color.
+    """
+    name: str
+    drag_press: float
+    drag_move: float
+    color_change: float
+
+
+def classic_profile(tool: str) -> PacingProfile:
+    """
+    The fixed delays GarticPainter always used (tool dependent color change).
+    """
+    return PacingProfile("classic", DRAG_DELAY, DRAG_DELAY, COLOR_CHANGE_DELAY[tool])
+
+
+# Built-in profiles besides "classic" (which depends on the tool)
+PACING_PROFILES = {
+    "fast": PacingProfile("fast", 0.002, 0.002, 0.002),
+    "turbo": PacingProfile("turbo", 0.0005, 0.0005, 0.001),
+}
+
+
+def precise_sleep(seconds: float):
+    """
+    Wait with sub-millisecond precision: sleep for the bulk of the time, then spin on
+    time.perf_counter for the rest (time.sleep alone can overshoot by a millisecond or more).
+    """
+    if seconds <= 0:
+        return
+    deadline = time.perf_counter() + seconds
+    if seconds > SPIN_THRESHOLD:
+        time.sleep(seconds - SPIN_THRESHOLD)
+    while time.perf_counter() < deadline:
+        pass
+
+
+def load_profiles(tool: str) -> dict:
+    """
+    All selectable profiles for a tool: classic, the built-in ones and a saved calibration.
+
+    Returns:
+        dict: Mapping of profile name to PacingProfile.
+    """
+    profiles = {"classic": classic_profile(tool), **PACING_PROFILES}
+    if os.path.exists(PACING_FILE):
+        with open(PACING_FILE, "r") as f:
+            profiles["calibrated"] = PacingProfile(**json.load(f))
+    return profiles
+
+
+def save_profile(profile: PacingProfile, path: str = PACING_FILE):
+    """
+    Save a (calibrated) profile so load_profiles offers it.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(asdict(profile), f, indent=2)
+
+
+def estimate_sleep(program: StrokeProgram, profile: PacingProfile) -> float:
+    """
+    Total seconds a program spends waiting with the given profile.
+    """
+    return (program.drag_count * (profile.drag_press + profile.drag_move)
+            + program.color_change_count * profile.color_change)
+
+
+def estimate_draw_time(program: StrokeProgram, profile: PacingProfile, event_cost: float = 0.0) -> float:
+    """
+    Seconds a program takes to draw: its sleeps plus `event_cost` per input event
+    (3 per palette click, 4 per drag), the same model SimulatedBackend's clock uses.
+    """
+    events = 3 * program.color_change_count + 4 * program.drag_count
+    return estimate_sleep(program, profile) + events * event_cost
+
+
+def _strokes_landed(capture, drawing_bbox: dict, strokes: list) -> int:
+    """
+    Count test strokes whose middle pixel shows the expected color on screen.
+
+    Args:
+        capture (callable): capture(left, top, width, height) -> BGR image.
+        drawing_bbox (dict): Bounding box of drawing canvas on screen.
+        strokes (list): (x0, y, x1, label) per test stroke, canvas coordinates.
+    """
+    right = max(x1 for _, _, x1, _ in strokes) + 1
+    bottom = max(y for _, y, _, _ in strokes) + 1
+    labels = gartic_labels(capture(drawing_bbox["left"], drawing_bbox["top"], right, bottom))
+    return sum(int(labels[y, (x0 + x1) // 2] == label) for x0, y, x1, label in strokes)
+
+
+def calibrate_pacing(
+    backend,
+    palette_xys: dict,
+    drawing_bbox: dict,
+    capture,
+    delays: tuple = CALIBRATION_DELAYS,
+    margin: float = CALIBRATION_MARGIN
+) -> PacingProfile:
+    """
+    Find the smallest delays that still register, by drawing short test lines in the
+    top-left corner of the canvas and checking a screenshot after each try.
+
+    Drag delays are lowered first (with a slow color change), then the color change
+    delay (alternating black and red so a missed switch shows up). Both stop at the
+    first delay that loses a stroke and keep the last one that worked, padded by `margin`.
+    Clear the canvas afterwards.
+
+    Args:
+        backend (InputBackend): Where the input goes.
+        palette_xys (dict): Mapping of color name to screen position.
+        drawing_bbox (dict): Bounding box of drawing canvas on screen.
+        capture (callable): capture(left, top, width, height) -> BGR image, e.g. screenshot_region_numpy.
+        delays (tuple): Candidate delays, slowest first.
+        margin (float): Safety factor applied to the found delays.
+
+    Returns:
+        PacingProfile: The "calibrated" profile.
+    """
+    black = gartic_color_names.index("black")
+    red = gartic_color_names.index("red")
+    slow = max(delays)
+
+    def try_delays(drag_delay: float, color_delay: float, alternate: bool) -> bool:
+        strokes = []
+        for i in range(CALIBRATION_STROKES):
+            label = red if alternate and i % 2 else black
+            strokes.append((5, 5 + 4 * i, 45, label))
+
+        # Paint the test area white first, so earlier tries don't count
+        backend.click(palette_xys["white"])
+        backend.sleep(slow)
+        for x0, y, x1, _ in strokes:
+            backend.drag((drawing_bbox["left"] + x0, drawing_bbox["top"] + y),
+                         (drawing_bbox["left"] + x1, drawing_bbox["top"] + y), slow, slow)
+
+        last_label = None
+        for x0, y, x1, label in strokes:
+            if label != last_label:
+                backend.click(palette_xys[gartic_color_names[label]])
+                backend.sleep(color_delay)
+                last_label = label
+            backend.drag((drawing_bbox["left"] + x0, drawing_bbox["top"] + y),
+                         (drawing_bbox["left"] + x1, drawing_bbox["top"] + y), drag_delay, drag_delay)
+
+        backend.sleep(0.1)  # Let the game render before looking
+        return _strokes_landed(capture, drawing_bbox, strokes) == len(strokes)
+
+    drag_delay = slow
+    for delay in delays:
+        if not try_delays(delay, slow, alternate=False):
+            break
+        drag_delay = delay
+
+    color_delay = slow
+    for delay in delays:
+        if not try_delays(drag_delay, delay, alternate=True):
+            break
+        color_delay = delay
+
+    return PacingProfile(
+        "calibrated",
+        float(np.round(drag_delay * margin, 6)),
+        float(np.round(drag_delay * margin, 6)),
+        float(np.round(color_delay * margin, 6)),
+    )
@@ -0,0 +1,102 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+from utils.color import gartic_labels, closest_gartic_labels, get_gartic_lut
+
+PARALLEL_BAND_ROWS = 64  # Rows per task handed to a worker
+
+_pools = {}
+
+
+def default_workers() -> int:
+    """
+    Number of worker processes to use when none is given: one per CPU core.
+    """
+    return os.cpu_count() or 1
+
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    """
+    A process pool per worker count, started once and reused across calls.
+    """
+    if workers not in _pools:
+        _pools[workers] = ProcessPoolExecutor(max_workers=workers)
+    return _pools[workers]
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    """
+    Open a shared memory block created by the parent, without letting this process
+    unlink it on exit.
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:  # Python < 3.13 has no track argument; workers share the parent's tracker
+        return shared_memory.SharedMemory(name=name)
+
+
+def _quantize_band(in_name: str, out_name: str, shape: tuple, y0: int, y1: int):
+    """
+    Worker: quantize rows y0..y1 of the shared input image into the shared label map.
+    """
+    shm_in, shm_out = _attach(in_name), _attach(out_name)
+    try:
+        img = np.ndarray(shape, dtype=np.uint8, buffer=shm_in.buf)
+        labels = np.ndarray(shape[:2], dtype=np.uint8, buffer=shm_out.buf)
+        labels[y0:y1] = closest_gartic_labels(img[y0:y1])
+        del img, labels  # Release the buffers before closing
+    finally:
+        shm_in.close()
+        shm_out.close()
+
+
+def parallel_gartic_labels(
+    img: np.ndarray,
+    workers: int | None = None,
+    band_rows: int = PARALLEL_BAND_ROWS,
+    use_lut: bool = True
+) -> np.ndarray:
+    """
+    Palette index of every pixel, computed in row bands on a process pool.
+
+    The image is copied once into shared memory; workers read their band from it and
+    write labels straight into a shared output block, so nothing is pickled but names
+    and row ranges. Gives exactly the same result as gartic_labels.
+
+    Args:
+        img (np.ndarray): Input image in BGR format.
+        workers (int): Worker processes. Defaults to the number of CPU cores.
+        band_rows (int): Rows per task.
+        use_lut (bool): Use the lookup table when it is built. It is fast enough that
+            the lookup then simply runs in this process.
+
+    Returns:
+        np.ndarray: uint8 array of shape (h, w) with indices into gartic_color_names.
+    """
+    workers = workers or default_workers()
+    img = np.ascontiguousarray(img[..., :3], dtype=np.uint8)
+    h, w = img.shape[:2]
+    if use_lut and get_gartic_lut() is not None:
+        return gartic_labels(img)
+    if workers <= 1 or h <= band_rows:
+        return closest_gartic_labels(img)
+
+    shm_in = shared_memory.SharedMemory(create=True, size=max(img.nbytes, 1))
+    shm_out = shared_memory.SharedMemory(create=True, size=max(h * w, 1))
+    try:
+        np.ndarray(img.shape, dtype=np.uint8, buffer=shm_in.buf)[:] = img
+        pool = _get_pool(workers)
+        futures = [
+            pool.submit(_quantize_band, shm_in.name, shm_out.name, img.shape, y, min(y + band_rows, h))
+            for y in range(0, h, band_rows)
+        ]
+        for future in futures:
+            future.result()
+
+        return np.ndarray((h, w), dtype=np.uint8, buffer=shm_out.buf).copy()
+    finally:
+        shm_in.close()
+        shm_in.unlink()
+        shm_out.close()
+        shm_out.unlink()
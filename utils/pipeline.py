@@ -0,0 +1,216 @@
+import math
+import queue
+import threading
+import numpy as np
+from utils.color import to_gartic_labels
+from utils.strokes import StrokeProgram, OP_COLOR, box_expand, plan_strokes
+from utils.ordering import arrange_strokes
+from utils.executor import run_stroke_program
+from utils.cache import cache_key, load_program, save_program
+
+STREAM_BAND_ROWS = 48  # Rough height of the bands planned ahead of the drawing
+STREAM_QUEUE_SIZE = 4  # Bands planned ahead at most
+
+
+def plan_drawing(
+    labels: np.ndarray,
+    tool: str,
+    step: int,
+    rectangles: bool = False,
+    group_colors: bool = False,
+    optimize_travel: bool = False,
+    labels_key: str | None = None
+) -> tuple:
+    """
+    Plan a whole drawing and apply the optional drawing-order passes, or load the result
+    from the cache when the same labels were planned with the same options before.
+
+    Args:
+        labels (np.ndarray): Palette index map (see utils.color.to_gartic_labels).
+        tool (str): "box" or "pen".
+        step (int): Drawing step.
+        rectangles (bool): Merge box rows into rectangles (box tool only).
+        group_colors (bool): Draw each color in one pass instead of row by row.
+        optimize_travel (bool): Reorder strokes within each color to cut cursor travel.
+        labels_key (str): Cache key of `labels` (see utils.cache). None = no caching.
+
+    Returns:
+        tuple: (program, report, cached): the arranged StrokeProgram, what the ordering
+        passes saved (see utils.ordering.arrange_strokes) and whether it came from the cache.
+    """
+    expand = box_expand(rectangles, group_colors)
+    if tool == "box":
+        plan_key = labels_key and cache_key(labels_key, "box", step, rectangles, expand, group_colors, optimize_travel)
+    else:
+        plan_key = labels_key and cache_key(labels_key, tool, step, group_colors, optimize_travel)
+
+    cached = load_program(plan_key) if plan_key else None
+    if cached is not None:
+        return (*cached, True)
+    program, report = arrange_strokes(plan_strokes(labels, tool, step, rectangles, expand),
+                                      group_colors=group_colors, optimize=optimize_travel)
+    if plan_key:
+        save_program(plan_key, program, report)
+    return program, report, False
+
+
+def band_height(quantize_step: int, draw_step: int, rows: int = STREAM_BAND_ROWS) -> int:
+    """
+    Band height close to `rows` that keeps the quantizer blocks and the drawing rows aligned.
+    """
+    unit = quantize_step * draw_step
+    return max(1, math.ceil(rows / unit)) * unit
+
+
+def plan_bands(
+    img: np.ndarray,
+    quantize_step: int,
+    tool: str,
+    draw_step: int,
+    rectangles: bool = False,
+    group_colors: bool = False,
+    optimize_travel: bool = False,
+    rows: int = STREAM_BAND_ROWS
+):
+    """
+    Quantize and plan an image band by band, top to bottom.
+
+    Gives the same strokes as planning the whole image, except that boxes are not
+    expanded across band edges. group_colors and optimize_travel work within each band.
+
+    Args:
+        img (np.ndarray): BGR image, already resized to the drawing area.
+        quantize_step (int): Block size for to_gartic_labels.
+        tool (str): "box" or "pen".
+        draw_step (int): Drawing step for the planner.
+        rectangles (bool): Merge box rows into rectangles.
+        group_colors (bool): Draw each color of a band in one pass.
+        optimize_travel (bool): Reorder strokes within each color to cut cursor travel.
+        rows (int): Rough band height.
+
+    Yields:
+        StrokeProgram: One program per band, in canvas coordinates.
+    """
+    height, width = img.shape[:2]
+    band = band_height(quantize_step, draw_step, rows)
+    expand = box_expand(rectangles, group_colors)
+
+    for top in range(0, height, band):
+        labels = to_gartic_labels(img[top:top+band], quantize_step)
+        program = plan_strokes(labels, tool, draw_step, rectangles, expand)
+        program, _ = arrange_strokes(program, group_colors, optimize_travel, time_budget=0.1)
+
+        ops = program.ops.copy()
+        ops[ops[:, 0] != OP_COLOR, 2] += top
+        ops[ops[:, 0] != OP_COLOR, 4] += top
+        yield StrokeProgram(ops, width, height, tool)
+
+
+def _planner_worker(bands, out: queue.Queue, stop_event: threading.Event):
+    """
+    Push planned bands into the queue until done or stopped. Ends with None (or the error).
+    """
+    try:
+        for program in bands:
+            while not stop_event.is_set():
+                try:
+                    out.put(program, timeout=0.1)
+                    break
+                except queue.Full:
+                    pass
+            if stop_event.is_set():
+                return
+        item = None
+    except Exception as e:  # Hand planner errors to the drawing thread
+        item = e
+
+    while not stop_event.is_set():
+        try:
+            out.put(item, timeout=0.1)
+            return
+        except queue.Full:
+            pass
+
+
+def stream_draw(
+    bands,
+    backend,
+    palette_xys: dict,
+    drawing_bbox: dict,
+    stop_event: threading.Event,
+    pacing=None,
+    queue_size: int = STREAM_QUEUE_SIZE,
+    trace=None
+) -> int:
+    """
+    Draw programs while they are still being planned: a background thread runs the
+    planner (e.g. plan_bands) into a bounded queue and this thread draws each program
+    as soon as it arrives. Setting stop_event cancels both.
+
+    Args:
+        bands (iterable): StrokePrograms, typically plan_bands(...).
+        backend (InputBackend): Where the input goes.
+        palette_xys (dict): Mapping of color name to screen position.
+        drawing_bbox (dict): Bounding box of drawing canvas on screen.
+        stop_event (threading.Event): Cancels planning and drawing once set.
+        pacing (PacingProfile): Delays around each event.
+        queue_size (int): Programs planned ahead at most.
+        trace (DrawTrace): Counts every batch sent and follows the progress (see utils.telemetry).
+            The total isn't known until the last band is planned, so it is extrapolated
+            from the rows planned so far.
+
+    Returns:
+        int: Number of ops executed.
+    """
+    planned = queue.Queue(maxsize=queue_size)
+    planner = threading.Thread(target=_planner_worker, args=(bands, planned, stop_event), daemon=True)
+    planner.start()
+
+    executed = 0
+    rows_planned = 0
+    last_label = None
+    if trace is not None:
+        trace.start_program(0)
+
+        def progress(position: int):
+            trace.update_progress(band_start + position)
+    else:
+        progress = None
+    try:
+        while not stop_event.is_set():
+            try:
+                program = planned.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if program is None:
+                if trace is not None and trace.total != executed:
+                    trace.total = executed  # Now known: finish the bar
+                    trace.update_progress(executed)
+                break
+            if isinstance(program, Exception):
+                raise program
+
+            ops = program.ops
+            color_ops = np.flatnonzero(ops[:, 0] == OP_COLOR)
+            if len(color_ops) == 0:
+                continue
+            # The band may start with the color that is already selected
+            if color_ops[0] == 0 and ops[0, 1] == last_label:
+                program = StrokeProgram(ops[1:], program.width, program.height, program.tool)
+            last_label = ops[color_ops[-1], 1]
+
+            band_start = executed
+            if trace is not None:
+                drags = program.drag_mask
+                rows_planned = max(rows_planned, int(program.ops[drags][:, [2, 4]].max()) + 1)
+                band_end = executed + len(program.ops)
+                trace.total = max(round(band_end * program.height / rows_planned), band_end)
+            executed += run_stroke_program(program, backend, palette_xys, drawing_bbox, stop_event, pacing,
+                                           progress=progress, trace=trace)
+    finally:
+        # Stop the planner if drawing ended early ('q' or an error)
+        if planner.is_alive():
+            stop_event.set()
+        planner.join()
+
+    return executed
@@ -0,0 +1,161 @@
+import json
+import os
+import time
+import numpy as np
+from utils.strokes import StrokeProgram, compile_ops, stroke_coverage, find_runs
+
+SESSION_DIR = os.path.join("temp", "session")
+CHECKPOINT_INTERVAL = 0.5  # Seconds between checkpoint writes while drawing
+MISSING_MIN_MATCH = 0.5  # A stroke counts as drawn when this share of its pixels shows its color
+
+
+class DrawingSession:
+    """
+    A drawing in progress, kept on disk so an interrupted run can be resumed: the
+    program is saved once when the session starts and the position reached in it is
+    checkpointed while drawing (a tiny JSON write at most every CHECKPOINT_INTERVAL).
+
+    Attributes:
+        program (StrokeProgram): The program being drawn.
+        position (int): Ops done so far.
+        done (bool): The program was drawn to the end.
+    """
+
+    def __init__(self, program: StrokeProgram, position: int = 0, done: bool = False, path: str = SESSION_DIR):
+        self.program = program
+        self.position = position
+        self.done = done
+        self.path = path
+        self._last_write = 0.0
+
+    @classmethod
+    def start(cls, program: StrokeProgram, path: str = SESSION_DIR) -> "DrawingSession":
+        """
+        Begin a new session for `program`, replacing any earlier one.
+        """
+        os.makedirs(path, exist_ok=True)
+        program.save(os.path.join(path, "program.npz"))
+        session = cls(program, path=path)
+        session._write_state()
+        return session
+
+    @classmethod
+    def load(cls, path: str = SESSION_DIR) -> "DrawingSession | None":
+        """
+        The last session, or None if there is none.
+        """
+        state_path = os.path.join(path, "state.json")
+        program_path = os.path.join(path, "program.npz")
+        if not (os.path.exists(state_path) and os.path.exists(program_path)):
+            return None
+        with open(state_path, "r") as f:
+            state = json.load(f)
+        return cls(StrokeProgram.load(program_path), state["position"], state["done"], path)
+
+    @staticmethod
+    def read_state(path: str = SESSION_DIR) -> dict | None:
+        """
+        The last session's checkpoint (position, total ops, done) without loading its
+        program, or None if there is none. Cheap enough to call on every app rerun.
+        """
+        state_path = os.path.join(path, "state.json")
+        if not (os.path.exists(state_path) and os.path.exists(os.path.join(path, "program.npz"))):
+            return None
+        with open(state_path, "r") as f:
+            return json.load(f)
+
+    @property
+    def remaining(self) -> int:
+        """Ops still to draw."""
+        return len(self.program.ops) - self.position
+
+    def _write_state(self):
+        # Temp file + rename, so a crash mid-write keeps the previous checkpoint
+        state_path = os.path.join(self.path, "state.json")
+        with open(state_path + ".tmp", "w") as f:
+            json.dump({"position": self.position, "total": len(self.program.ops), "done": self.done}, f)
+        os.replace(state_path + ".tmp", state_path)
+        self._last_write = time.monotonic()
+
+    def checkpoint(self, position: int, force: bool = False):
+        """
+        Record the position reached. Written to disk only every CHECKPOINT_INTERVAL
+        seconds unless `force`; pass this as the executor's progress callback.
+        """
+        self.position = position
+        self.done = position >= len(self.program.ops)
+        if force or self.done or time.monotonic() - self._last_write >= CHECKPOINT_INTERVAL:
+            self._write_state()
+
+
+def missing_strokes(
+    program: StrokeProgram,
+    canvas_labels: np.ndarray,
+    min_match: float = MISSING_MIN_MATCH,
+    slack: int = 0
+) -> StrokeProgram:
+    """
+    The strokes of a program that a captured canvas does not show.
+
+    Each pixel belongs to the drag that paints it last (see stroke_coverage); a drag is
+    missing when fewer than `min_match` of its pixels show its color. Drags that later
+    ones paint over completely are never missing. A missing box that later boxes partly
+    cover is redrawn as the row runs it still owns, so the repair doesn't paint over
+    its successors (e.g. the overlap of expanded boxes). With a `slack`, a pixel also
+    matches when the color shows within that many pixels of it, for lines the game
+    paints a little wider or thinner than stroke_coverage assumes.
+
+    Args:
+        program (StrokeProgram): The program that was (partly) drawn.
+        canvas_labels (np.ndarray): Palette index map of the captured drawing area.
+        min_match (float): Share of matching pixels a drawn stroke needs.
+        slack (int): Distance in pixels a matching color may be off by.
+
+    Returns:
+        StrokeProgram: The missing drags, in their original order.
+    """
+    segments = program.segments
+    segment_labels = program.segment_labels
+
+    coverage = stroke_coverage(program)
+    drawn = coverage >= 0
+    owners = coverage[drawn]
+    wanted = segment_labels[owners]
+    if slack:
+        ys, xs = np.nonzero(drawn)
+        padded = np.pad(canvas_labels[:program.height, :program.width], slack, mode="edge")
+        matches = np.zeros(len(owners), dtype=bool)
+        for dy in range(2 * slack + 1):
+            for dx in range(2 * slack + 1):
+                matches |= padded[ys + dy, xs + dx] == wanted
+    else:
+        matches = canvas_labels[:program.height, :program.width][drawn] == wanted
+
+    owned = np.bincount(owners, minlength=len(segments))
+    matched = np.bincount(owners, weights=matches, minlength=len(segments))
+    missing = (owned > 0) & (matched < min_match * owned)
+
+    if program.tool == "box":
+        area = (np.abs(segments[:, 2] - segments[:, 0]) + 1) * (np.abs(segments[:, 3] - segments[:, 1]) + 1)
+        partial = missing & (owned < area)
+        missing &= ~partial
+
+        # Row runs of the pixels the partly covered boxes still own
+        owner_map = np.full_like(coverage, -1)
+        owner_map[drawn] = np.where(partial[owners], owners, -1)
+        ys, x_starts, x_ends, run_owners = find_runs(owner_map)
+        keep = run_owners >= 0
+        pieces = np.stack([x_starts[keep], ys[keep], x_ends[keep], ys[keep]], axis=1)
+        piece_owners = run_owners[keep]
+    else:
+        pieces = np.zeros((0, 4), dtype=np.int32)
+        piece_owners = np.zeros(0, dtype=np.int32)
+
+    # Everything back in the original drawing order
+    whole = np.flatnonzero(missing)
+    owner_order = np.concatenate([whole, piece_owners])
+    order = np.argsort(owner_order, kind="stable")
+    repair = np.concatenate([segments[whole], pieces]).astype(np.int32)[order]
+    repair_labels = segment_labels[owner_order[order]]
+
+    return StrokeProgram(compile_ops(repair, repair_labels), program.width, program.height, program.tool)
@@ -0,0 +1,380 @@
+from dataclasses import dataclass
+import cv2 as cv
+import numpy as np
+from utils.color import WHITE_LABEL
+
+# Op codes of a stroke program. Every op is a row of 5 int32 values:
+#   OP_COLOR: (OP_COLOR, label, 0, 0, 0)   -> pick palette color `label`
+#   OP_DRAG:  (OP_DRAG, x0, y0, x1, y1)     -> drag from (x0, y0) to (x1, y1), canvas coordinates
+OP_COLOR = 0
+OP_DRAG = 1
+
+SKIP_LABEL = 255  # Pixels with this label are never drawn (e.g. already right on the canvas)
+
+BOX_EXPAND = 3  # Slightly widen box strokes so neighbouring boxes overlap
+PEN_WIDTH = 4  # Line thickness of the pen size the app asks for, in pixels
+
+# Pause after clicking a palette color, per drawing tool (seconds)
+COLOR_CHANGE_DELAY = {"box": 0.003, "pen": 0.005}
+# Pause after pressing and after moving during a drag (seconds)
+DRAG_DELAY = 0.005
+
+
+@dataclass
+class StrokeProgram:
+    """
+    A compiled drawing: a flat list of color-change and drag ops for one tool.
+
+    Attributes:
+        ops (np.ndarray): int32 array of shape (n, 5), see OP_COLOR / OP_DRAG.
+        width (int): Canvas width the program was planned for.
+        height (int): Canvas height the program was planned for.
+        tool (str): "box" or "pen".
+    """
+    ops: np.ndarray
+    width: int
+    height: int
+    tool: str
+
+    @property
+    def drag_mask(self) -> np.ndarray:
+        return self.ops[:, 0] == OP_DRAG
+
+    @property
+    def segments(self) -> np.ndarray:
+        """(n, 4) array of x0, y0, x1, y1 for every drag, in program order."""
+        return self.ops[self.drag_mask, 1:]
+
+    @property
+    def segment_labels(self) -> np.ndarray:
+        """Palette index each drag is drawn with, in program order."""
+        is_color = self.ops[:, 0] == OP_COLOR
+        # Carry the label of the latest color op forward onto every op
+        last_color_op = np.maximum.accumulate(np.where(is_color, np.arange(len(self.ops)), -1))
+        labels = self.ops[np.maximum(last_color_op, 0), 1]
+        return labels[self.drag_mask].astype(np.uint8)
+
+    @property
+    def drag_count(self) -> int:
+        return int(np.count_nonzero(self.drag_mask))
+
+    @property
+    def color_change_count(self) -> int:
+        return int(np.count_nonzero(self.ops[:, 0] == OP_COLOR))
+
+    def save(self, path: str):
+        """
+        Save the program as a compressed .npz file.
+        """
+        np.savez_compressed(path, ops=self.ops, width=self.width, height=self.height, tool=self.tool)
+
+    @classmethod
+    def load(cls, path: str) -> "StrokeProgram":
+        """
+        Load a program written by save().
+        """
+        with np.load(path) as data:
+            return cls(ops=data["ops"], width=int(data["width"]), height=int(data["height"]), tool=str(data["tool"]))
+
+
+def compile_ops(segments: np.ndarray, labels: np.ndarray) -> np.ndarray:
+    """
+    Turn an ordered list of segments and their colors into ops, inserting a color
+    change wherever the color differs from the previous segment.
+
+    Args:
+        segments (np.ndarray): (n, 4) array of x0, y0, x1, y1.
+        labels (np.ndarray): (n,) palette index of each segment.
+
+    Returns:
+        np.ndarray: int32 ops array, see OP_COLOR / OP_DRAG.
+    """
+    n = len(segments)
+    labels = np.asarray(labels)
+    changes = np.ones(n, dtype=bool)
+    changes[1:] = labels[1:] != labels[:-1]
+
+    # Each segment moves down by the number of color ops inserted before (and at) it
+    drag_rows = np.arange(n) + np.cumsum(changes)
+    color_rows = drag_rows[changes] - 1
+
+    ops = np.zeros((n + int(np.count_nonzero(changes)), 5), dtype=np.int32)
+    ops[drag_rows, 0] = OP_DRAG
+    ops[drag_rows, 1:] = segments
+    ops[color_rows, 0] = OP_COLOR
+    ops[color_rows, 1] = labels[changes]
+    return ops
+
+
+def find_runs(labels: np.ndarray, row_step: int = 1, x_step: int = 1):
+    """
+    Find horizontal runs of the same color on every `row_step`-th row, sampling every `x_step`-th pixel.
+
+    Args:
+        labels (np.ndarray): Palette index map.
+        row_step (int): Only rows 0, row_step, 2*row_step, ... are scanned.
+        x_step (int): Only columns 0, x_step, 2*x_step, ... are sampled.
+
+    Returns:
+        tuple: (ys, x_starts, x_ends, run_labels) arrays in scanline order. x_ends is the
+        last sampled column of the run (inclusive).
+    """
+    rows = labels[::row_step, ::x_step]
+    n_rows, n_cols = rows.shape
+
+    # A run ends wherever the next sample has a different color (or at the row end)
+    ends = np.ones((n_rows, n_cols), dtype=bool)
+    ends[:, :-1] = rows[:, 1:] != rows[:, :-1]
+    starts = np.ones((n_rows, n_cols), dtype=bool)
+    starts[:, 1:] = ends[:, :-1]
+
+    row_idx, start_cols = np.nonzero(starts)
+    _, end_cols = np.nonzero(ends)
+
+    return (
+        (row_idx * row_step).astype(np.int32),
+        (start_cols * x_step).astype(np.int32),
+        (end_cols * x_step).astype(np.int32),
+        rows[row_idx, start_cols],
+    )
+
+
+def plan_box_strokes(
+    labels: np.ndarray,
+    step: int = 5,
+    expand: int = BOX_EXPAND,
+    background: int | None = WHITE_LABEL
+) -> StrokeProgram:
+    """
+    Plan the box tool: every `step`-th row is split into same-color runs and each run
+    is drawn as `step` stacked thin boxes. Background and SKIP_LABEL runs are skipped.
+
+    Args:
+        labels (np.ndarray): Palette index map.
+        step (int): Vertical step between drawing lines.
+        expand (int): Pixels each box reaches past its run to the right and down. Relies on
+            later strokes painting over the overlap, so use 0 for any order but scanline.
+        background (int): Label of the blank canvas, not drawn. None = draw every color.
+
+    Returns:
+        StrokeProgram: The compiled program.
+    """
+    height, width = labels.shape
+    ys, x_starts, x_ends, run_labels = find_runs(labels, row_step=step)
+
+    keep = (run_labels != background) & (run_labels != SKIP_LABEL)
+    ys, x_starts, x_ends, run_labels = ys[keep], x_starts[keep], x_ends[keep], run_labels[keep]
+
+    # Every run becomes `step` boxes, one per row it covers
+    ys = (ys[:, np.newaxis] + np.arange(step, dtype=np.int32)).ravel()
+    x_starts = np.repeat(x_starts, step)
+    x_ends = np.repeat(x_ends, step)
+    run_labels = np.repeat(run_labels, step)
+
+    inside = ys < height
+    ys, x_starts, x_ends, run_labels = ys[inside], x_starts[inside], x_ends[inside], run_labels[inside]
+
+    segments = np.stack([
+        x_starts,
+        ys,
+        np.minimum(x_ends + expand, width - 1),
+        np.minimum(ys + expand, height - 1),
+    ], axis=1)
+
+    return StrokeProgram(compile_ops(segments, run_labels), width, height, "box")
+
+
+def plan_box_rectangles(
+    labels: np.ndarray,
+    step: int = 5,
+    expand: int = 0,
+    background: int | None = WHITE_LABEL
+) -> StrokeProgram:
+    """
+    Plan the box tool with one drag per rectangle instead of one per row.
+
+    Every `step`-th row is split into runs, and identical runs (same start, end and color)
+    on consecutive scanned rows are merged greedily into one axis-aligned rectangle, so
+    the drawing ends up the same as with plan_box_strokes. Needs the filled box tool.
+
+    Args:
+        labels (np.ndarray): Palette index map.
+        step (int): Vertical step between drawing lines.
+        expand (int): Pixels each box reaches past its rectangle to the right and down.
+            Keep 0 (see box_expand): rectangles are drawn in order of their top edge, so
+            the overlap of a lower one can cover a taller rectangle drawn before it.
+        background (int): Label of the blank canvas, not drawn. None = draw every color.
+
+    Returns:
+        StrokeProgram: The compiled program.
+    """
+    height, width = labels.shape
+    ys, x_starts, x_ends, run_labels = find_runs(labels, row_step=step)
+
+    keep = (run_labels != background) & (run_labels != SKIP_LABEL)
+    ys, x_starts, x_ends, run_labels = ys[keep], x_starts[keep], x_ends[keep], run_labels[keep]
+    if len(ys) == 0:
+        return StrokeProgram(np.zeros((0, 5), dtype=np.int32), width, height, "box")
+
+    # Identical runs share a key; sorting by (key, row) puts vertically stacked runs next to each other
+    keys = (x_starts.astype(np.int64) * (width + 1) + x_ends) * 256 + run_labels
+    rows = ys // step
+    order = np.lexsort((rows, keys))
+    keys, rows = keys[order], rows[order]
+
+    # A new rectangle starts where the key changes or a scanned row is skipped
+    new_rect = np.ones(len(order), dtype=bool)
+    new_rect[1:] = (keys[1:] != keys[:-1]) | (rows[1:] != rows[:-1] + 1)
+    first = np.flatnonzero(new_rect)
+    last = np.append(first[1:], len(order)) - 1
+
+    top = rows[first] * step
+    bottom = np.minimum((rows[last] + 1) * step - 1, height - 1)
+    run = order[first]
+
+    segments = np.stack([
+        x_starts[run],
+        top,
+        np.minimum(x_ends[run] + expand, width - 1),
+        np.minimum(bottom + expand, height - 1),
+    ], axis=1).astype(np.int32)
+    rect_labels = run_labels[run]
+
+    # Back to scanline order of the top-left corners
+    scan = np.lexsort((segments[:, 0], segments[:, 1]))
+    return StrokeProgram(compile_ops(segments[scan], rect_labels[scan]), width, height, "box")
+
+
+def plan_pen_strokes(labels: np.ndarray, step: int) -> StrokeProgram:
+    """
+    Plan the pen tool: every `step`-th row is sampled every `step` pixels and each
+    same-color run is drawn as one horizontal line. SKIP_LABEL runs are skipped.
+
+    Args:
+        labels (np.ndarray): Palette index map.
+        step (int): Resolution (spacing) of the drawing scan.
+
+    Returns:
+        StrokeProgram: The compiled program.
+    """
+    height, width = labels.shape
+    ys, x_starts, x_ends, run_labels = find_runs(labels, row_step=step, x_step=step)
+
+    keep = run_labels != SKIP_LABEL
+    ys, x_starts, x_ends, run_labels = ys[keep], x_starts[keep], x_ends[keep], run_labels[keep]
+    segments = np.stack([x_starts, ys, x_ends, ys], axis=1)
+
+    return StrokeProgram(compile_ops(segments, run_labels), width, height, "pen")
+
+
+def box_expand(rectangles: bool = False, group_colors: bool = False) -> int:
+    """
+    How far to expand boxes (BOX_EXPAND or 0). Only rows of boxes drawn in scanline order
+    get the overlap: it is always painted over by a later box there, whereas merged
+    rectangles and color-grouped programs would lose strokes under it.
+    """
+    return 0 if rectangles or group_colors else BOX_EXPAND
+
+
+def plan_strokes(
+    labels: np.ndarray,
+    tool: str,
+    step: int,
+    rectangles: bool = False,
+    expand: int | None = None,
+    background: int | None = WHITE_LABEL
+) -> StrokeProgram:
+    """
+    Plan a drawing for the given tool ("box" or "pen"). `rectangles`, `expand` and `background` apply to the box tool only
+    (expand defaults to box_expand(rectangles)).
+    """
+    if tool == "box":
+        planner = plan_box_rectangles if rectangles else plan_box_strokes
+        return planner(labels, step, box_expand(rectangles) if expand is None else expand, background)
+    if tool == "pen":
+        return plan_pen_strokes(labels, step)
+    raise ValueError(f"Unknown drawing tool: {tool}")
+
+
+def stroke_coverage(program: StrokeProgram, pen_width: int = PEN_WIDTH) -> np.ndarray:
+    """
+    Which drag paints each canvas pixel last, replaying the program in order. Boxes
+    cover their rectangle; pen strokes a line of `pen_width` pixels.
+
+    Args:
+        program (StrokeProgram): The compiled program.
+        pen_width (int): Line thickness of the pen tool in pixels.
+
+    Returns:
+        np.ndarray: int32 array of shape (height, width) holding the index of the drag
+        (into program.segments), -1 where nothing is drawn.
+    """
+    coverage = np.full((program.height, program.width), -1, dtype=np.int32)
+    for i, (x0, y0, x1, y1) in enumerate(program.segments.tolist()):
+        if program.tool == "box":
+            coverage[min(y0, y1):max(y0, y1) + 1, min(x0, x1):max(x0, x1) + 1] = i
+        else:
+            cv.line(coverage, (x0, y0), (x1, y1), i, pen_width)
+    return coverage
+
+
+def group_by_color(program: StrokeProgram) -> StrokeProgram:
+    """
+    Reorder a program so every color is drawn in one pass (at most one switch per color).
+
+    Colors covering the most strokes go first, so small details end up on top of large
+    areas where strokes overlap (plan box programs with expand=0 for this order).
+    Within a color, rows are drawn top to bottom in serpentine order (alternating
+    left-to-right and right-to-left) to cut cursor travel. A segment draws the same line
+    or box in either direction, so reversed rows simply swap their end points.
+
+    Args:
+        program (StrokeProgram): Program in any order.
+
+    Returns:
+        StrokeProgram: The reordered program.
+    """
+    segments = program.segments
+    labels = program.segment_labels
+    if len(segments) == 0:
+        return program
+
+    # Rank colors by stroke count, largest first
+    counts = np.bincount(labels, minlength=256)
+    rank = np.argsort(np.argsort(-counts, kind="stable"), kind="stable")
+    layer = rank[labels]
+
+    # Alternate direction on every other row of a layer
+    _, row_index = np.unique(layer.astype(np.int64) * (program.height + 1) + segments[:, 1], return_inverse=True)
+    reverse = (row_index % 2) == 1
+    x_key = np.where(reverse, -segments[:, 0], segments[:, 0])
+
+    order = np.lexsort((x_key, segments[:, 1], layer))
+    segments = segments[order]
+    labels = labels[order]
+
+    flipped = segments.copy()
+    flip = reverse[order]
+    flipped[flip] = segments[flip][:, [2, 3, 0, 1]]
+
+    return StrokeProgram(compile_ops(flipped, labels), program.width, program.height, program.tool)
+
+
+def color_change_savings(before: StrokeProgram, after: StrokeProgram) -> dict:
+    """
+    Compare the palette switches of two orderings of the same drawing.
+
+    Args:
+        before (StrokeProgram): Original program (e.g. scanline order).
+        after (StrokeProgram): Reordered program.
+
+    Returns:
+        dict: color_changes_before, color_changes_after, switches_saved, sleep_saved (seconds).
+    """
+    saved = before.color_change_count - after.color_change_count
+    return {
+        "color_changes_before": before.color_change_count,
+        "color_changes_after": after.color_change_count,
+        "switches_saved": saved,
+        "sleep_saved": saved * COLOR_CHANGE_DELAY[before.tool],
+    }
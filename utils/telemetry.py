@@ -0,0 +1,184 @@
+import csv
+import io
+import json
+import os
+import time
+from contextlib import contextmanager
+import numpy as np
+from utils.strokes import OP_COLOR, OP_DRAG, PEN_WIDTH
+
+TRACE_DIR = os.path.join("temp", "traces")
+PROGRESS_INTERVAL = 0.25  # Seconds between progress callbacks (e.g. UI refreshes)
+
+# Columns of the runs table, one row per drawing: settings, phase seconds, counters
+TRACE_SETTINGS = ["mode", "image", "tool", "step", "details", "dither", "pacing", "group_colors", "rectangles",
+                  "optimize_travel", "verify", "width", "height"]
+TRACE_PHASES = ["decode", "resize", "quantize", "plan", "draw"]
+TRACE_COUNTERS = ["ops", "drags", "color_changes", "pixels_covered", "sleep_seconds", "inject_seconds"]
+
+
+class DrawTrace:
+    """
+    Where the time of one drawing goes: seconds per phase (decode, resize, quantize, plan,
+    draw), what the executor sent (counted per batch, so the hot loop is untouched), and
+    the progress through the program for a live ETA.
+
+    Sleep time is what the pacing profile asked for; injection time is the rest of the
+    time spent sending batches (building and injecting the events, sleep overshoot).
+
+    Attributes:
+        settings (dict): How the drawing was made (tool, step, pacing, ...), to compare runs.
+        phases (dict): Seconds per phase.
+        counters (dict): Totals of TRACE_COUNTERS.
+        reports (dict): Reports of the steps that made the drawing (ordering, verification).
+        position (int): Ops of the program done so far.
+        total (int): Ops in the program (0 = unknown, e.g. while streaming).
+        samples (list): (seconds since drawing started, position) after every batch.
+    """
+
+    def __init__(self, settings: dict | None = None, on_progress=None):
+        self.settings = dict(settings or {})
+        self.phases = {}
+        self.counters = dict.fromkeys(TRACE_COUNTERS, 0)
+        self.reports = {}
+        self.position = 0
+        self.total = 0
+        self.samples = []
+        self.on_progress = on_progress
+        self._started = None
+        self._start_position = 0
+        self._last_callback = 0.0
+
+    @contextmanager
+    def phase(self, name: str):
+        """
+        Time a block as `name` (added up if the phase runs more than once).
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
+
+    def start_program(self, total: int, position: int = 0):
+        """
+        Progress is counted from here: a program of `total` ops, starting at `position`.
+        """
+        self.total = total
+        self.position = self._start_position = position
+        self._started = time.perf_counter()
+
+    def record_batch(self, ops: np.ndarray, tool: str, seconds: float, pacing):
+        """
+        Count a batch of ops the executor sent in `seconds` with `pacing`.
+        """
+        kinds = ops[:, 0]
+        drags = ops[kinds == OP_DRAG]
+        color_changes = int(np.count_nonzero(kinds == OP_COLOR))
+        dx = np.abs(drags[:, 3] - drags[:, 1]) + 1
+        dy = np.abs(drags[:, 4] - drags[:, 2]) + 1
+        # Box: the filled rectangle. Pen: a PEN_WIDTH thick line along the longer axis
+        pixels = dx * dy if tool == "box" else np.maximum(dx, dy) * PEN_WIDTH
+        sleep = len(drags) * (pacing.drag_press + pacing.drag_move) + color_changes * pacing.color_change
+
+        counters = self.counters
+        counters["ops"] += len(ops)
+        counters["drags"] += len(drags)
+        counters["color_changes"] += color_changes
+        counters["pixels_covered"] += int(pixels.sum())
+        counters["sleep_seconds"] += sleep
+        counters["inject_seconds"] += max(seconds - sleep, 0.0)
+
+    def update_progress(self, position: int):
+        """
+        Record the position reached; calls on_progress at most every PROGRESS_INTERVAL.
+        """
+        if self._started is None:
+            self.start_program(self.total, position)
+        self.position = position
+        now = time.perf_counter()
+        self.samples.append((round(now - self._started, 4), position))
+        if self.on_progress is not None and (now - self._last_callback >= PROGRESS_INTERVAL or self.done):
+            self._last_callback = now
+            self.on_progress(self)
+
+    @property
+    def done(self) -> bool:
+        return self.total > 0 and self.position >= self.total
+
+    @property
+    def fraction(self) -> float:
+        """Share of the program done, 0..1 (0 while the total is unknown)."""
+        return min(self.position / self.total, 1.0) if self.total else 0.0
+
+    @property
+    def eta(self) -> float | None:
+        """Seconds left at the speed so far, or None before any progress."""
+        done = self.position - self._start_position
+        if self._started is None or done <= 0 or not self.total:
+            return None
+        return (time.perf_counter() - self._started) / done * (self.total - self.position)
+
+    def summary(self) -> dict:
+        """
+        One flat row: settings, seconds per phase and counters.
+        """
+        row = {name: self.settings.get(name, "") for name in TRACE_SETTINGS}
+        row.update({f"{name}_seconds": round(self.phases[name], 4) if name in self.phases else "" for name in TRACE_PHASES})
+        row.update({name: round(value, 4) if isinstance(value, float) else value for name, value in self.counters.items()})
+        row["position"], row["total"] = self.position, self.total
+        return row
+
+    def to_dict(self) -> dict:
+        return {
+            "summary": self.summary(),
+            "settings": self.settings,
+            "phases": self.phases,
+            "counters": self.counters,
+            "reports": self.reports,
+            "samples": self.samples,
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), indent=2, default=str)
+
+    def to_csv(self) -> str:
+        """
+        The summary row with a header, as CSV text.
+        """
+        out = io.StringIO()
+        _write_rows(out, [self.summary()], header=True)
+        return out.getvalue()
+
+
+def _write_rows(f, rows: list, header: bool):
+    writer = csv.DictWriter(f, fieldnames=list(rows[0]), lineterminator="\n")
+    if header:
+        writer.writeheader()
+    writer.writerows(rows)
+
+
+def save_trace(trace: DrawTrace, directory: str = TRACE_DIR) -> str:
+    """
+    Keep a finished trace: the full trace as a timestamped JSON file, and its summary
+    appended to runs.csv in the same directory, so runs with different modes and steps
+    can be compared side by side.
+
+    Returns:
+        str: Path of the JSON file.
+    """
+    os.makedirs(directory, exist_ok=True)
+    name = time.strftime("trace_%Y%m%d_%H%M%S")
+    path = os.path.join(directory, f"{name}.json")
+    count = 1
+    while os.path.exists(path):  # Several runs within a second (benchmarks)
+        count += 1
+        path = os.path.join(directory, f"{name}_{count}.json")
+    with open(path, "w") as f:
+        f.write(trace.to_json())
+
+    runs_path = os.path.join(directory, "runs.csv")
+    new_file = not os.path.exists(runs_path)
+    with open(runs_path, "a", newline="") as f:
+        _write_rows(f, [trace.summary()], header=new_file)
+    return path
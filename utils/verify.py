@@ -0,0 +1,191 @@
+import threading
+from dataclasses import replace
+import numpy as np
+from utils.color import screen_gartic_labels
+from utils.strokes import StrokeProgram, OP_COLOR, OP_DRAG, PEN_WIDTH, compile_ops
+from utils.executor import run_stroke_program
+from utils.pacing import PacingProfile, classic_profile
+from utils.session import missing_strokes
+
+VERIFY_EVERY = 200  # Drags between canvas checks
+VERIFY_SETTLE = 0.05  # Seconds to let the game render before a check
+VERIFY_RETRIES = 2  # Redraw attempts per failed stroke
+
+# Adaptive pacing: delays are scaled by a factor that rises fast on drops and falls slowly without
+PACING_RAISE_ABOVE = 0.01  # Drop rate of a check above which delays go up
+PACING_RAISE = 1.5
+PACING_LOWER = 0.9
+PACING_LOWER_AFTER = 3  # Clean checks in a row before delays go down
+PACING_MIN_FACTOR = 0.5
+PACING_MAX_FACTOR = 8.0
+
+
+class AdaptivePacing:
+    """
+    A pacing profile that follows the drop rate seen by the verifier: all delays are
+    raised by PACING_RAISE when a check loses more than PACING_RAISE_ABOVE of its
+    strokes, and lowered by PACING_LOWER after PACING_LOWER_AFTER clean checks.
+
+    Attributes:
+        base (PacingProfile): Profile the factor is applied to.
+        factor (float): Current scale of all delays.
+    """
+
+    def __init__(self, base: PacingProfile):
+        self.base = base
+        self.factor = 1.0
+        self._clean_checks = 0
+
+    @property
+    def profile(self) -> PacingProfile:
+        return replace(
+            self.base,
+            name=f"{self.base.name} x{self.factor:.2f}",
+            drag_press=self.base.drag_press * self.factor,
+            drag_move=self.base.drag_move * self.factor,
+            color_change=self.base.color_change * self.factor,
+        )
+
+    def update(self, drop_rate: float):
+        """
+        Feed the share of strokes a check found missing.
+        """
+        if drop_rate > PACING_RAISE_ABOVE:
+            self.factor = min(self.factor * PACING_RAISE, PACING_MAX_FACTOR)
+            self._clean_checks = 0
+        elif drop_rate == 0:
+            self._clean_checks += 1
+            if self._clean_checks >= PACING_LOWER_AFTER:
+                self.factor = max(self.factor * PACING_LOWER, PACING_MIN_FACTOR)
+                self._clean_checks = 0
+
+
+def check_points(program: StrokeProgram, start: int = 0, every: int = VERIFY_EVERY, per_layer: bool = False) -> list:
+    """
+    Op positions after which the canvas is checked: every `every` drags, or at the end of
+    each color layer (before every color op). Always ends with the end of the program.
+    """
+    ops = program.ops
+    if per_layer:
+        points = np.flatnonzero(ops[start:, 0] == OP_COLOR) + start
+    else:
+        drags = np.flatnonzero(ops[start:, 0] == OP_DRAG) + start
+        points = drags[every - 1::every] + 1
+    return sorted(set(int(p) for p in points if p > start) | {len(ops)})
+
+
+def _row_window(segments: np.ndarray, program: StrokeProgram) -> tuple:
+    """
+    Canvas rows [top, bottom) that drags can paint, with room for the pen's thickness.
+    """
+    margin = PEN_WIDTH if program.tool == "pen" else 0
+    top = max(int(segments[:, [1, 3]].min()) - margin, 0)
+    bottom = min(int(segments[:, [1, 3]].max()) + margin + 1, program.height)
+    return top, bottom
+
+
+def _shift_rows(program: StrokeProgram, dy: int, height: int) -> StrokeProgram:
+    """
+    The program moved `dy` rows down, on a canvas `height` rows tall.
+    """
+    ops = program.ops.copy()
+    drags = ops[:, 0] == OP_DRAG
+    ops[drags, 2] += dy
+    ops[drags, 4] += dy
+    return StrokeProgram(ops, program.width, height, program.tool)
+
+
+def run_verified_program(
+    program: StrokeProgram,
+    backend,
+    palette_xys: dict,
+    drawing_bbox: dict,
+    capture,
+    stop_event: threading.Event | None = None,
+    pacing: PacingProfile | None = None,
+    every: int = VERIFY_EVERY,
+    per_layer: bool = False,
+    retries: int = VERIFY_RETRIES,
+    start: int = 0,
+    progress=None,
+    trace=None
+) -> dict:
+    """
+    Draw a program with closed-loop checking: after every `every` drags (or every color
+    layer) the rows of the canvas the stretch touched are captured, the strokes of that
+    stretch that don't show on them are found (see utils.session.missing_strokes) and
+    redrawn right away, before later strokes can cover their spot. Delays adapt to the
+    drop rate (AdaptivePacing).
+
+    Args:
+        program (StrokeProgram): Program to draw.
+        backend (InputBackend): Where the input goes.
+        palette_xys (dict): Mapping of color name to screen position.
+        drawing_bbox (dict): Bounding box of drawing canvas on screen.
+        capture (callable): capture(bbox) -> BGR image of a screen box, called with the
+            rows of the drawing area a stretch touches.
+        stop_event (threading.Event): Stops before the next batch once set.
+        pacing (PacingProfile): Starting delays. Defaults to the classic delays of the tool.
+        every (int): Drags between checks.
+        per_layer (bool): Check after each color layer instead (for color-grouped programs).
+        retries (int): Redraw attempts per stretch.
+        start (int): Op to start at (see run_stroke_program).
+        progress (callable): Called with the position reached after every check.
+        trace (DrawTrace): Counts every batch sent, redraws included (see utils.telemetry).
+
+    Returns:
+        dict: checks, strokes checked, missed, redrawn and still missing after the
+        retries, plus the final pacing factor and position.
+    """
+    adaptive = AdaptivePacing(pacing or classic_profile(program.tool))
+    report = {"checks": 0, "strokes_checked": 0, "missed": 0, "redrawn": 0, "still_missing": 0}
+
+    # Op position, segment and color of every drag, to cut out the stretch just drawn
+    drag_ops = np.flatnonzero(program.drag_mask)
+    segments, segment_labels = program.segments, program.segment_labels
+
+    position = start
+    for end in check_points(program, start, every, per_layer):
+        if stop_event is not None and stop_event.is_set():
+            break
+        stretch_start = position
+        # A view up to the check point: the executor only converts the ops from `position` on
+        stretch = StrokeProgram(program.ops[:end], program.width, program.height, program.tool)
+        position = run_stroke_program(stretch, backend, palette_xys, drawing_bbox, stop_event, adaptive.profile,
+                                      start=position, trace=trace)
+
+        # Only this stretch's strokes are checked, so redraws can't cover strokes drawn after them
+        in_stretch = (drag_ops >= stretch_start) & (drag_ops < position)
+        if not in_stretch.any():
+            continue
+        # ... and only the rows they touch are captured, matched and covered
+        top, bottom = _row_window(segments[in_stretch], program)
+        band_bbox = {**drawing_bbox, "top": drawing_bbox["top"] + top, "height": bottom - top,
+                     "bottom": drawing_bbox["top"] + bottom}
+        drawn = _shift_rows(StrokeProgram(compile_ops(segments[in_stretch], segment_labels[in_stretch]),
+                                          program.width, program.height, program.tool), -top, bottom - top)
+        for attempt in range(retries + 1):
+            if drawn.drag_count == 0:
+                break
+            backend.sleep(VERIFY_SETTLE)
+            missing = missing_strokes(drawn, screen_gartic_labels(capture(band_bbox)))
+            report["checks"] += 1
+            if attempt == 0:
+                report["strokes_checked"] += drawn.drag_count
+                report["missed"] += missing.drag_count
+                adaptive.update(missing.drag_count / drawn.drag_count)
+            if missing.drag_count == 0:
+                break
+            if attempt == retries or (stop_event is not None and stop_event.is_set()):
+                report["still_missing"] += missing.drag_count
+                break
+            run_stroke_program(missing, backend, palette_xys, band_bbox, stop_event, adaptive.profile, trace=trace)
+            report["redrawn"] += missing.drag_count
+            drawn = missing
+
+        if progress is not None:
+            progress(position)
+
+    report["pacing_factor"] = round(adaptive.factor, 3)
+    report["position"] = position
+    return report